@@ -0,0 +1,81 @@
+"""
+Compares the time 'analyze_python_file' takes with the full 'ast' parse and with the header-only '--fast' mode.
+
+By default a large synthetic module is generated; existing files can be passed instead.
+
+Usage:
+    python benchmarks/fast_extraction.py [--classes N] [--methods N] [--body-lines N] [--repeat N] [files ...]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from main import analyze_python_file
+
+
+def synthetic_module(classes, methods, body_lines):
+    """Build the source of a module with documented, annotated classes whose methods have long bodies."""
+    lines = ["from typing import List", ""]
+    for i in range(classes):
+        lines += [f"class Class{i}(Class{i - 1}):" if i else "class Class0:",
+                  f'    """Docstring of Class{i}."""',
+                  "    name: str",
+                  f"    items: List[Class{i}]",
+                  "",
+                  "    def __init__(self, name: str):",
+                  "        self.name = name",
+                  "        self.items = []",
+                  ""]
+        for j in range(methods):
+            lines += [f"    def method{j}(self, value: int, other: 'Class{i}') -> List[int]:",
+                      f'        """Docstring of method{j}."""',
+                      "        result = []"]
+            for k in range(body_lines):
+                lines.append(f"        result.append(value * {k} + len(self.items) if other else {{'k': [{k}]}})")
+            lines += ["        return result", ""]
+    return "\n".join(lines) + "\n"
+
+
+def best_time(function, repeat):
+    """Return the result of 'function' and the fastest of 'repeat' timed calls."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="*", help="Python files to analyse instead of a synthetic module.")
+    parser.add_argument("--classes", type=int, default=200)
+    parser.add_argument("--methods", type=int, default=10)
+    parser.add_argument("--body-lines", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    files = args.files
+    tempFile = None
+    if not files:
+        with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as tempFile:
+            tempFile.write(synthetic_module(args.classes, args.methods, args.body_lines))
+        files = [tempFile.name]
+
+    try:
+        for iterFilePath in files:
+            full, fullTime = best_time(lambda: analyze_python_file(iterFilePath), args.repeat)
+            fast, fastTime = best_time(lambda: analyze_python_file(iterFilePath, fast=True), args.repeat)
+            name = "synthetic module" if tempFile else iterFilePath
+            print(f"{name}: {os.path.getsize(iterFilePath) / 1024:.0f} KiB, {len(full[0])} classes")
+            print(f"  ast:  {fullTime * 1000:10.1f} ms")
+            print(f"  fast: {fastTime * 1000:10.1f} ms   ({fullTime / fastTime:.1f}x, "
+                  f"{'same' if full[0] == fast[0] else 'different'} classes)")
+    finally:
+        if tempFile:
+            os.remove(tempFile.name)
@@ -0,0 +1,68 @@
+"""
+Compares the memory footprint of the analysis results as nested dictionaries (the format used before the
+'model' records) and as slotted, interned records.
+
+Usage:
+    python benchmarks/memory_model.py [--classes N] [--methods N] [--attributes N]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from model import as_class_infos
+
+
+def synthetic_class_dicts(classes, methods, attributes):
+    """Build class dictionaries in the pre-record format, with fresh (non interned) strings like a JSON load."""
+    results = []
+    for i in range(classes):
+        results.append({
+            'class_name': f"Class{i}",
+            'docstring': f"Docstring of Class{i}",
+            'methods': [{'name': f"method{j}", 'return_type': f"Class{(i + j) % classes}",
+                         'docstring': str(), 'input_types': {'self': None, 'value': "int", 'other': f"Class{j % classes}"}}
+                        for j in range(methods)],
+            'attributes': [{'name': f"attr{j}", 'type': "str" if j % 2 else f"Class{j % classes}"} for j in range(attributes)],
+            'base_classes': [f"Class{i - 1}"] if i else []
+        })
+    return json.loads(json.dumps(results))
+
+
+def measure(build):
+    """Return the object built by 'build' and the number of bytes it still holds once built."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def records_from(source):
+    """Load the dictionaries and convert them, keeping only the records."""
+    return as_class_infos(json.loads(source))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--classes", type=int, default=5000)
+    parser.add_argument("--methods", type=int, default=10)
+    parser.add_argument("--attributes", type=int, default=8)
+    args = parser.parse_args()
+
+    source = json.dumps(synthetic_class_dicts(args.classes, args.methods, args.attributes))
+    dicts, dictBytes = measure(lambda: json.loads(source))
+    del dicts
+    records, recordBytes = measure(lambda: records_from(source))
+
+    print(f"{args.classes} classes, {args.methods} methods and {args.attributes} attributes each")
+    print(f"dictionaries: {dictBytes / args.classes:10.0f} bytes per class")
+    print(f"records:      {recordBytes / args.classes:10.0f} bytes per class")
+    print(f"saving:       {100 * (1 - recordBytes / dictBytes):10.1f} %")
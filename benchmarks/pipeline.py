@@ -0,0 +1,162 @@
+"""
+Times every stage of building a merged diagram of a synthetic package, and compares the timings to a baseline.
+
+The stages are: analysing the files ('analyze_python_file'), building the symbol index and relations, rendering
+the class boxes, the layout ('arrange_boxes' for the default polygon layout), placing the arrows and writing
+the XML. Each stage is run '--repeat' times, each time with cold caches, and its fastest run is reported. With
+'--output' the results are saved as JSON; with '--baseline' they are compared to an earlier JSON file, and the
+script exits with status 1 when a stage got slower than the baseline by more than '--threshold'.
+
+Usage:
+    python benchmarks/pipeline.py [--classes N] [--modules N] ... [--layout NAME] [--routing NAME] [--verbose-relations]
+                                  [--repeat N] [--output results.json] [--baseline baseline.json] [--threshold F]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from geometry import np
+from main import (LAYOUT_ENGINES, ROUTING_STYLES, SymbolIndex, aggregate_relations, analyze_python_file, class_boxes,
+                  collect_relations, compute_arrows, cached_format_docstring, write_class_diagram)
+from partition import _package_of
+from synthetic import add_options, options_from, write_package
+
+STAGES = ("analyze", "relations", "boxes", "layout", "arrows", "xml")
+
+
+def run_pipeline(paths, xmlPath, layout="polygon", routing="straight", verbose_relations=False):
+    """
+    Runs the stages of a merged diagram once.
+
+    Returns:
+    - tuple: A dict mapping each stage name to its wall time in seconds, and a dict of counts describing the
+             diagram.
+    """
+    timings = {}
+    # Every run starts cold, as a real run would, instead of reusing what the previous repeat cached
+    for memoized in (cached_format_docstring, _package_of):
+        memoized.cache_clear()
+
+    def timed(stage, function):
+        start = time.perf_counter()
+        result = function()
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    results = timed("analyze", lambda: [analyze_python_file(path) for path in paths])
+
+    def relations():
+        symbolIndex = SymbolIndex()
+        analysis = []
+        for path, (thisAnalysis, thisImportedModules) in zip(paths, results):
+            symbolIndex.add(thisAnalysis, thisImportedModules, path)
+            analysis.extend(thisAnalysis)
+        collected = collect_relations(analysis, symbolIndex)
+        drawn = collected if verbose_relations else aggregate_relations(collected)
+        return symbolIndex.diagram_classes(analysis), collected, drawn
+
+    analysis, collected, relations = timed("relations", relations)
+    nodeCoords = timed("boxes", lambda: class_boxes(analysis))
+    nodeCoords = timed("layout", lambda: LAYOUT_ENGINES[layout](nodeCoords, relations))
+    drawn = [relation for relation in relations if relation.target in nodeCoords]
+    arrows = timed("arrows", lambda: compute_arrows(nodeCoords, drawn, routing))
+    timed("xml", lambda: write_class_diagram(xmlPath, analysis, nodeCoords, arrows))
+    return timings, {"files": len(paths), "classes": len(analysis), "relations": len(collected), "arrows": len(arrows)}
+
+
+def benchmark(options, layout="polygon", repeat=3, routing="straight", verbose_relations=False):
+    """
+    Generates a synthetic package with 'options' (see 'synthetic.generate_sources') and times its stages.
+
+    Returns:
+    - dict: The JSON serialisable results.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_package(os.path.join(directory, "synthpkg"), **options)
+        runs = {stage: [] for stage in STAGES}
+        for _ in range(repeat):
+            timings, counts = run_pipeline(paths, os.path.join(directory, "diagram.uxf"), layout, routing,
+                                          verbose_relations)
+            for stage, seconds in timings.items():
+                runs[stage].append(seconds)
+
+    return {
+        "config": dict(options, layout=layout, routing=routing, verbose_relations=verbose_relations, repeat=repeat),
+        "environment": {"python": platform.python_version(), "implementation": platform.python_implementation(),
+                        "numpy": np is not None},
+        "counts": counts,
+        "stages": {stage: {"best": min(seconds), "median": statistics.median(seconds)} for stage, seconds in runs.items()},
+        "total": sum(min(seconds) for seconds in runs.values()),
+    }
+
+
+def compare(results, baseline, threshold=0.1, noise=0.001):
+    """
+    Compares the best time of every stage to a baseline.
+
+    Parameters:
+    - results (dict): The results of 'benchmark'.
+    - baseline (dict): Earlier results of 'benchmark'.
+    - threshold (float, optional): The relative slowdown beyond which a stage counts as a regression.
+    - noise (float, optional): Slowdowns of fewer seconds than this are never regressions.
+
+    Returns:
+    - list: (stage, baseline seconds, seconds, ratio, regressed) tuples for the stages found in both.
+    """
+    rows = []
+    for stage, timing in results["stages"].items():
+        if stage not in baseline.get("stages", {}):
+            continue
+        before, after = baseline["stages"][stage]["best"], timing["best"]
+        ratio = after / before if before else float("inf")
+        rows.append((stage, before, after, ratio, ratio > 1 + threshold and after - before > noise))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_options(parser)
+    parser.add_argument("--layout", choices=sorted(LAYOUT_ENGINES), default="polygon")
+    parser.add_argument("--routing", choices=ROUTING_STYLES, default="straight")
+    parser.add_argument("--verbose-relations", action="store_true", help="Draw one arrow per relation.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare the results to this JSON file.")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown of a stage that counts as a regression (default 0.1 = 10%%).")
+    args = parser.parse_args()
+
+    results = benchmark(options_from(args), args.layout, args.repeat, args.routing, args.verbose_relations)
+    counts = results["counts"]
+    print(f"{counts['files']} files, {counts['classes']} classes, {counts['relations']} relations, "
+          f"{counts['arrows']} arrows")
+    for stage, timing in results["stages"].items():
+        print(f"{stage:10} {timing['best'] * 1000:10.1f} ms")
+    print(f"{'total':10} {results['total'] * 1000:10.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Wrote results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("config") != results["config"]:
+            print("Warning: the baseline was run with a different configuration.")
+        regressions = 0
+        print(f"\nCompared to {args.baseline}:")
+        for stage, before, after, ratio, regressed in compare(results, baseline, args.threshold):
+            regressions += regressed
+            print(f"{stage:10} {before * 1000:10.1f} ms -> {after * 1000:10.1f} ms  {ratio:6.2f}x"
+                  f"{'  REGRESSION' if regressed else ''}")
+        if regressions:
+            print(f"{regressions} stage(s) slower than the baseline by more than {args.threshold:.0%}.")
+            sys.exit(1)
@@ -0,0 +1,128 @@
+"""
+Generates a synthetic Python package to benchmark the tool on codebases of a chosen size and shape.
+
+The generated modules are meant to be analysed, not imported: classes refer to each other across modules
+without import statements, so every reference shows up as a relation in the merged diagram.
+
+Usage:
+    python benchmarks/synthetic.py OUTPUT_DIR [--classes N] [--modules N] [--methods N] [--attributes N]
+                                   [--depth N] [--density F] [--docstring-words N] [--body-lines N] [--seed N]
+"""
+import argparse
+import os
+import random
+
+WORDS = ("the", "class", "holds", "data", "about", "a", "value", "that", "is", "used", "by", "other", "parts",
+         "of", "system", "and", "returns", "result", "when", "called", "with", "given", "state", "each", "item")
+BUILTIN_TYPES = ("int", "str", "float", "bool", "bytes")
+
+
+def docstring(rng, words, indent):
+    """Build a docstring of 'words' random words, or nothing when 'words' is 0."""
+    if not words:
+        return []
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return [f'{indent}"""', f"{indent}{text.capitalize()}.", f'{indent}"""']
+
+
+def generate_sources(classes=200, modules=10, methods=5, attributes=4, depth=3, density=0.3, docstring_words=20,
+                     body_lines=3, seed=0):
+    """
+    Build the sources of a synthetic package.
+
+    Parameters:
+    - classes (int, optional): The total number of classes.
+    - modules (int, optional): The number of modules the classes are spread over, round robin.
+    - methods (int, optional): The number of methods per class, besides '__init__'.
+    - attributes (int, optional): The number of annotated class attributes per class.
+    - depth (int, optional): The length of the inheritance chains; classes form chains of 'depth'
+                             classes, each inheriting from the previous one. 0 or 1 disables inheritance.
+    - density (float, optional): The probability that an attribute, argument or return type refers to another
+                                 class of the package instead of a builtin type.
+    - docstring_words (int, optional): The length of every class and method docstring, in words.
+    - body_lines (int, optional): The number of statements in every method body.
+    - seed (int, optional): The seed of the random choices, so that a configuration always gives the same code.
+
+    Returns:
+    - dict: Maps module file names to their source code.
+    """
+    rng = random.Random(seed)
+    modules = max(1, min(modules, classes))
+    names = [f"Class{i}" for i in range(classes)]
+    nameSet = set(names)
+
+    def some_type():
+        if names and rng.random() < density:
+            return rng.choice(names)
+        return rng.choice(BUILTIN_TYPES)
+
+    moduleLines = {f"mod{m}.py": ["from typing import List", ""] for m in range(modules)}
+    for i, name in enumerate(names):
+        lines = moduleLines[f"mod{i % modules}.py"]
+        base = f"({names[i - 1]})" if depth > 1 and i % depth else ""
+        lines.append(f"class {name}{base}:")
+        lines += docstring(rng, docstring_words, "    ")
+        for a in range(attributes):
+            attrType = some_type()
+            if attrType in nameSet and rng.random() < 0.5:
+                attrType = f"List[{attrType}]"
+            lines.append(f"    attr{a}: {attrType}")
+        lines += ["", "    def __init__(self, value: int):", "        self.value = value", ""]
+        for m in range(methods):
+            lines.append(f"    def method{m}(self, first: {some_type()}, second: {some_type()}) -> {some_type()}:")
+            lines += docstring(rng, docstring_words, "        ")
+            lines.append("        total = 0")
+            for b in range(body_lines):
+                lines.append(f"        total += len(str(first)) * {b} if second else {b}")
+            lines += ["        return total", ""]
+        lines.append("")
+    sources = {fileName: "\n".join(lines) + "\n" for fileName, lines in moduleLines.items()}
+    sources["__init__.py"] = '"""A synthetic package generated for benchmarking."""\n'
+    return sources
+
+
+def write_package(directory, **options):
+    """
+    Write a synthetic package to 'directory', see 'generate_sources' for the options.
+
+    Returns:
+    - list: The paths of the written modules, in a stable order.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for fileName, source in sorted(generate_sources(**options).items()):
+        path = os.path.join(directory, fileName)
+        with open(path, "w") as file:
+            file.write(source)
+        paths.append(path)
+    return paths
+
+
+def add_options(parser):
+    """Add the options of 'generate_sources' to an argument parser."""
+    parser.add_argument("--classes", type=int, default=200)
+    parser.add_argument("--modules", type=int, default=10)
+    parser.add_argument("--methods", type=int, default=5)
+    parser.add_argument("--attributes", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=3, help="Length of the inheritance chains.")
+    parser.add_argument("--density", type=float, default=0.3,
+                        help="Probability that a type refers to another class of the package.")
+    parser.add_argument("--docstring-words", type=int, default=20)
+    parser.add_argument("--body-lines", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def options_from(args):
+    """The 'generate_sources' options of parsed arguments."""
+    return {"classes": args.classes, "modules": args.modules, "methods": args.methods,
+            "attributes": args.attributes, "depth": args.depth, "density": args.density,
+            "docstring_words": args.docstring_words, "body_lines": args.body_lines, "seed": args.seed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory", help="Directory the package is written to.")
+    add_options(parser)
+    args = parser.parse_args()
+    paths = write_package(args.directory, **options_from(args))
+    print(f"Wrote {len(paths)} files to {args.directory}")
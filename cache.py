@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import pickle
+import sys
+
+
+def read_source(file_path):
+    """
+    Reads a file to be analysed, along with the size and modification time it had when it was read.
+
+    Parameters:
+    - file_path (str): The path to the Python file.
+
+    Returns:
+    - tuple: The (content, stat) snapshot of the file, the content as bytes and the stat as a (size, mtime in
+             nanoseconds) pair. Analyse the content and pass the snapshot to 'AnalysisCache.put'.
+
+    Raises:
+    - OSError: If the file cannot be read.
+    """
+    with open(file_path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        return f.read(), (stat.st_size, stat.st_mtime_ns)
+
+
+class AnalysisCache:
+    """
+    A persistent on-disk cache for the results of 'analyze_python_file'.
+
+    Each entry stores the (analysis_results, imported_modules) tuple of one file and is keyed by a hash of the
+    file's content combined with a stamp describing the analysis schema and the running Python version, so
+    entries written by an older version of the tool (or a different AST) are never reused. An index of
+    path -> (size, mtime, key) lets unchanged files be resolved from a single 'os.stat' call without reading
+    them at all. The total size of the cache is capped; when it grows past the cap the least recently used
+    entries are evicted.
+
+    Attributes:
+    - directory (str): The directory holding the cache entries and the index.
+    - max_bytes (int): The size cap of all cache entries together, in bytes.
+    - stamp (str): The tool-version/schema stamp mixed into every key.
+    - hits (int): The number of lookups answered from the cache.
+    - misses (int): The number of lookups that required a fresh analysis.
+    """
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, directory, schema_version, max_bytes=256 * 1024 * 1024):
+        """
+        Opens (and if needed creates) the cache in 'directory'.
+
+        Parameters:
+        - directory (str): The directory holding the cache.
+        - schema_version (int or str): The version of the analysis result format. Bumping it invalidates
+                                       every existing entry.
+        - max_bytes (int, optional): The size cap of the cache in bytes. Defaults to 256 MiB.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stamp = f"{schema_version}-py{sys.version_info[0]}.{sys.version_info[1]}"
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(os.path.join(directory, self.INDEX_NAME), "r") as f:
+                index = json.load(f)
+            self._index = index["files"] if index.get("stamp") == self.stamp else {}
+        except (OSError, ValueError, KeyError, TypeError):
+            self._index = {}
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + ".pickle")
+
+    def _key_for(self, data):
+        digest = hashlib.sha256(self.stamp.encode())
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _load(self, key):
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                result = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return None
+        # Touch the entry so that eviction treats it as recently used
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return result
+
+    def get(self, file_path):
+        """
+        Looks up the cached analysis of 'file_path'.
+
+        If the size and modification time of the file match the index, the entry is loaded without reading the
+        file. Otherwise the file content is hashed and looked up by hash, so touching a file or moving it
+        around does not force a new analysis.
+
+        Parameters:
+        - file_path (str): The path to the Python file.
+
+        Returns:
+        - tuple or None: The cached (analysis_results, imported_modules) tuple, or None on a miss.
+        """
+        abs_path = os.path.abspath(file_path)
+        try:
+            stat = os.stat(abs_path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        known = self._index.get(abs_path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            result = self._load(known[2])
+            if result is not None:
+                self.hits += 1
+                return result
+
+        try:
+            with open(abs_path, "rb") as f:
+                key = self._key_for(f.read())
+        except OSError:
+            self.misses += 1
+            return None
+        result = self._load(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self._index[abs_path] = [stat.st_size, stat.st_mtime_ns, key]
+        self._dirty = True
+        self.hits += 1
+        return result
+
+    def put(self, file_path, result, snapshot):
+        """
+        Stores the analysis of 'file_path' in the cache.
+
+        The entry is keyed by the content the analysis was made from, not by what the file holds now, so a file
+        changed while it was being analysed is not stored under its new content.
+
+        Parameters:
+        - file_path (str): The path to the analysed Python file.
+        - result (tuple): The (analysis_results, imported_modules) tuple returned by 'analyze_python_file'.
+        - snapshot (tuple): The (content, stat) snapshot the analysis was made from, as returned by
+                            'read_source'.
+        """
+        abs_path = os.path.abspath(file_path)
+        data, stat = snapshot
+        key = self._key_for(data)
+
+        entry_path = self._entry_path(key)
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, entry_path)
+        except OSError:
+            return
+        self._index[abs_path] = [stat[0], stat[1], key]
+        self._dirty = True
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in 'max_bytes'.
+        """
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".pickle"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                    total += stat.st_size
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+        live = {os.path.basename(path)[:-len(".pickle")] for _, _, path in entries if os.path.exists(path)}
+        self._index = {k: v for k, v in self._index.items() if v[2] in live}
+        self._dirty = True
+
+    def save(self):
+        """
+        Enforces the size cap and writes the index back to disk.
+        """
+        self.evict()
+        if not self._dirty:
+            return
+        index_path = os.path.join(self.directory, self.INDEX_NAME)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"stamp": self.stamp, "files": self._index}, f)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            return
+        self._dirty = False
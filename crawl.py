@@ -0,0 +1,75 @@
+import fnmatch
+import os
+
+# Directory names that never contain sources worth diagramming
+SKIPPED_DIRECTORIES = {
+    "__pycache__", ".git", ".hg", ".svn", ".tox", ".nox", ".venv", "venv", "env",
+    ".mypy_cache", ".pytest_cache", ".ruff_cache", "node_modules", "site-packages",
+}
+
+
+def _matches(relative_path, patterns):
+    """Check a path relative to the crawl root (and its basename) against a list of glob patterns."""
+    name = os.path.basename(relative_path)
+    return any(fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def _is_virtualenv(path):
+    """A directory holding a 'pyvenv.cfg' is a virtual environment, whatever it is called."""
+    return os.path.isfile(os.path.join(path, "pyvenv.cfg"))
+
+
+def iter_python_files(paths, include=None, exclude=None):
+    """
+    Lazily yields the Python files named by 'paths', walking directories recursively.
+
+    File arguments are yielded as they are. Directory arguments are walked depth first with 'os.scandir', in
+    sorted order so repeated runs see the files in the same order, and every file is yielded as soon as it is
+    found, so a consumer can start analysing before the walk finishes. '__pycache__', version control
+    directories, tool caches and virtual environments are skipped, as are symlinked directories to avoid
+    walking in circles.
+
+    Parameters:
+    - paths (list): File and directory paths, as given on the command line.
+    - include (list, optional): Glob patterns a crawled file must match, checked against its basename and its
+                                path relative to the directory argument. Defaults to ["*.py"].
+    - exclude (list, optional): Glob patterns of crawled files and directories to skip.
+
+    Yields:
+    - str: The path of each discovered Python file.
+
+    Raises:
+    - FileNotFoundError: If one of 'paths' is neither a file nor a directory.
+    """
+    include = include or ["*.py"]
+    exclude = exclude or []
+
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+        elif os.path.isdir(path):
+            yield from _walk(path, path, include, exclude)
+        else:
+            raise FileNotFoundError(path)
+
+
+def _walk(root, directory, include, exclude):
+    try:
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError:
+        return
+
+    subdirectories = []
+    for entry in entries:
+        relative_path = os.path.relpath(entry.path, root)
+        if exclude and _matches(relative_path, exclude):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name not in SKIPPED_DIRECTORIES and not _is_virtualenv(entry.path):
+                subdirectories.append(entry.path)
+        elif entry.is_file() and _matches(relative_path, include):
+            yield entry.path
+
+    for subdirectory in subdirectories:
+        yield from _walk(root, subdirectory, include, exclude)
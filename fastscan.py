@@ -0,0 +1,267 @@
+import itertools
+import re
+import tokenize
+from bisect import bisect_right
+
+# A class or function header at the start of a line
+_HEADER = re.compile(r"(?:async[ \t]+)?(def|class)[ \t]+(\w+)")
+# A function header on a single line, such as 'def f(self, x: int) -> str:  # comment'
+_SIMPLE_DEF = re.compile(r"[^#'\"\\]*:[ \t]*(?:#.*)?$")
+# The start of a triple quoted docstring
+_DOCSTRING = re.compile(r"[ \t]*[rRuU]?(\"\"\"|''')")
+_INDENTED_WITH_TABS = re.compile(r"^[ ]*\t", re.MULTILINE)
+_block_end_patterns = {}
+
+
+class HeaderScanError(Exception):
+    """Raised when a source file uses a construct the header scanner cannot follow."""
+
+
+def _indent_width(line):
+    """The width of the indentation of a line, with tabs expanded as the Python tokenizer does."""
+    prefix = line[:len(line) - len(line.lstrip(" \t\f"))]
+    return len(prefix.expandtabs(8))
+
+
+def _is_blank(line):
+    stripped = line.strip()
+    return not stripped or stripped.startswith("#")
+
+
+def _needs_tokenizing(text):
+    """
+    Tells whether a line (or a block of lines) may continue past its end, through a multi-line string, a
+    backslash or an open bracket. Only such text is handed to the tokenizer; everything else is taken or
+    skipped by looking at indentation alone.
+    """
+    if '"""' in text or "'''" in text or "\\\n" in text or text.rstrip("\r\n").endswith("\\"):
+        return True
+    return (text.count("(") + text.count("[") + text.count("{")
+            != text.count(")") + text.count("]") + text.count("}"))
+
+
+class _Source:
+    """The lines of a source file together with their offsets into the full text."""
+
+    def __init__(self, source):
+        self.lines = source.splitlines(keepends=True)
+        if self.lines and not self.lines[-1].endswith(("\n", "\r")):
+            self.lines[-1] += "\n"
+        self.text = "".join(self.lines)
+        self.offsets = list(itertools.accumulate((len(line) for line in self.lines), initial=0))
+        self.tabs = _INDENTED_WITH_TABS.search(self.text) is not None
+
+    def line_at(self, offset):
+        """The index of the line containing the character at 'offset'."""
+        return bisect_right(self.offsets, offset) - 1
+
+    def readline(self, start):
+        """A 'readline' function for the tokenizer returning the lines from line 'start' on."""
+        lines = self.lines
+        return (lines[i] for i in range(start, len(lines))).__next__
+
+    def logical_line_end(self, start):
+        """
+        Finds the end of the logical line starting at line 'start' with the tokenizer.
+
+        Returns:
+        - int: The index of the first line after the logical line.
+        """
+        readline = self.readline(start)
+        try:
+            for token in tokenize.generate_tokens(readline):
+                if token.type == tokenize.NEWLINE:
+                    return start + token.end[0]
+                if token.type == tokenize.ENDMARKER:
+                    break
+        except (tokenize.TokenError, SyntaxError) as e:
+            raise HeaderScanError(f"line {start + 1}: {e}") from e
+        return len(self.lines)
+
+    def statement_end(self, start):
+        """The index of the first line after the statement starting at line 'start'."""
+        if _needs_tokenizing(self.lines[start]):
+            return self.logical_line_end(start)
+        return start + 1
+
+    def scan_def(self, start):
+        """
+        Finds the extent of the header and docstring of the function defined at line 'start'.
+
+        Returns:
+        - tuple: (header_end, docstring_end, body_indent), the indices of the first lines after the header and
+                 after the docstring (equal when there is none) and the indentation of the body. 'body_indent'
+                 is None when the body is on the same line as the header.
+        """
+        lines = self.lines
+        if not _SIMPLE_DEF.match(lines[start]) or _needs_tokenizing(lines[start]):
+            return self.tokenize_def(start)
+
+        header_end = body = start + 1
+        while body < len(lines) and _is_blank(lines[body]):
+            body += 1
+        if body == len(lines):
+            raise HeaderScanError(f"line {start + 1}: could not find the body of the function")
+        line = lines[body]
+        body_indent = line[:len(line) - len(line.lstrip(" \t\f"))]
+        docstring = _DOCSTRING.match(line)
+        if docstring is None:
+            if line.lstrip().startswith(("'", '"')):
+                return self.tokenize_def(start)
+            return header_end, header_end, body_indent
+
+        quotes = docstring.group(1)
+        close = self.text.find(quotes, self.offsets[body] + docstring.end())
+        if close < 0:
+            raise HeaderScanError(f"line {body + 1}: unterminated docstring")
+        closeLine = self.line_at(close)
+        rest = self.text[close + 3:self.offsets[closeLine + 1]].strip()
+        if self.text[close - 1] == "\\" or (rest and not rest.startswith("#")):
+            return self.tokenize_def(start)
+        return header_end, closeLine + 1, body_indent
+
+    def tokenize_def(self, start):
+        """The same as 'scan_def' for any function header, using the tokenizer."""
+        readline = self.readline(start)
+        depth = 0
+        state = "header"
+        header_end = body_indent = docstring_end = None
+        try:
+            for token in tokenize.generate_tokens(readline):
+                kind, string = token.type, token.string
+                if state == "header":
+                    if kind == tokenize.OP and string in "([{":
+                        depth += 1
+                    elif kind == tokenize.OP and string in ")]}":
+                        depth -= 1
+                    elif kind == tokenize.OP and string == ":" and depth == 0:
+                        state = "colon"
+                elif state == "colon":
+                    if kind == tokenize.NEWLINE:
+                        header_end = start + token.end[0]
+                        state = "body"
+                    elif kind != tokenize.COMMENT:
+                        # A one line function such as 'def f(): pass'
+                        end = self.logical_line_end(start)
+                        return end, end, None
+                elif state == "body":
+                    if kind == tokenize.INDENT:
+                        body_indent = string
+                    elif kind == tokenize.STRING:
+                        docstring_end = start + token.end[0]
+                        state = "docstring"
+                    elif kind not in (tokenize.NL, tokenize.COMMENT):
+                        break
+                elif state == "docstring":
+                    if kind != tokenize.NEWLINE:
+                        # Not a docstring after all, e.g. '"text".join(...)'
+                        docstring_end = None
+                    break
+                if kind == tokenize.ENDMARKER:
+                    break
+        except (tokenize.TokenError, SyntaxError) as e:
+            raise HeaderScanError(f"line {start + 1}: {e}") from e
+        if header_end is None or body_indent is None:
+            raise HeaderScanError(f"line {start + 1}: could not find the body of the function")
+        return header_end, docstring_end or header_end, body_indent
+
+    def block_end(self, start, indent):
+        """
+        Finds where the block of a statement with indentation 'indent' ends, starting at line 'start'.
+
+        The end is searched for in the whole text with a regular expression. Only when the skipped text could
+        hide a line continuation, such as a multi-line string, is the block walked statement by statement.
+
+        Returns:
+        - int: The index of the first line that is neither blank nor indented deeper than 'indent'.
+        """
+        if not self.tabs:
+            pattern = _block_end_patterns.get(indent)
+            if pattern is None:
+                pattern = re.compile(r"^[ ]{0,%d}[^ \t\f\r\n#]" % indent, re.MULTILINE)
+                _block_end_patterns[indent] = pattern
+            found = pattern.search(self.text, self.offsets[start])
+            end = self.line_at(found.start()) if found else len(self.lines)
+            if not _needs_tokenizing(self.text[self.offsets[start]:self.offsets[end]]):
+                return self._trim_blank(start, end)
+
+        end = start
+        while end < len(self.lines):
+            line = self.lines[end]
+            if _is_blank(line):
+                end += 1
+            elif _indent_width(line) <= indent:
+                break
+            else:
+                end = self.statement_end(end)
+        return self._trim_blank(start, end)
+
+    def _trim_blank(self, start, end):
+        # Trailing blank lines and comments belong to whatever follows
+        while end > start and _is_blank(self.lines[end - 1]):
+            end -= 1
+        return end
+
+
+def header_source(source):
+    """
+    Reduces Python source to what a class diagram needs from it, without building a syntax tree.
+
+    Function bodies are dropped and replaced by their docstring (if any) and '...'. Everything else is kept as
+    it is: module and class level statements, class and function headers with their decorators, and the
+    bodies of '__init__' methods of classes, which assign the instance attributes. Function bodies are skipped
+    by their indentation; only headers and text that may continue over several lines (through brackets,
+    backslashes or multi-line strings) are read with 'tokenize'. Skipping a body this way costs a fraction of
+    parsing it.
+
+    Note:
+    - Classes defined and modules imported inside function bodies, other than those of '__init__' methods,
+      are dropped along with the body.
+
+    Parameters:
+    - source (str): The Python source code.
+
+    Returns:
+    - str: Source code for 'ast.parse' describing the same classes, methods and attributes.
+
+    Raises:
+    - HeaderScanError: If the source uses a construct the scanner cannot follow, e.g. because it is not valid
+                       Python. Callers should parse the original source instead.
+    """
+    scanned = _Source(source)
+    lines = scanned.lines
+    kept = []
+    classIndents = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if _is_blank(line):
+            kept.append(line)
+            i += 1
+            continue
+
+        indent = _indent_width(line)
+        while classIndents and classIndents[-1] >= indent:
+            classIndents.pop()
+        header = _HEADER.match(line, len(line) - len(line.lstrip(" \t\f")))
+        if header is None or header.group(1) == "class":
+            if header is not None:
+                classIndents.append(indent)
+            end = scanned.statement_end(i)
+            kept.extend(lines[i:end])
+            i = end
+            continue
+
+        header_end, docstring_end, body_indent = scanned.scan_def(i)
+        if body_indent is None:
+            kept.extend(lines[i:header_end])
+            i = header_end
+            continue
+        end = scanned.block_end(docstring_end, indent)
+        if header.group(2) == "__init__" and classIndents:
+            kept.extend(lines[i:end])
+        else:
+            kept.extend(lines[i:docstring_end])
+            kept.append(body_indent + "...\n")
+        i = end
+    return "".join(kept)
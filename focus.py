@@ -0,0 +1,90 @@
+import re
+from collections import deque
+
+
+def adjacency_index(relations):
+    """
+    Index the classes related to each class, in both directions.
+
+    Parameters:
+    - relations (list): The 'Relation' records of a diagram.
+
+    Returns:
+    - dict: Maps every class name found in 'relations' to the list of names it uses or is used by, in relation
+            order and without repeats.
+    """
+    index = {}
+    for relation in relations:
+        source, target = relation.source, relation.target
+        if source == target:
+            continue
+        index.setdefault(source, {})[target] = None
+        index.setdefault(target, {})[source] = None
+    return {name: list(neighbours) for name, neighbours in index.items()}
+
+
+def _focus_names(names, focus):
+    """
+    The class names 'focus' refers to: an exact name, or the end of a dotted name, so that "Config" finds
+    "pkg.mod.Config" and "Group.Meta" finds the nested class "pkg.mod.Group.Meta".
+    """
+    found = []
+    for wanted in focus:
+        if wanted in names:
+            found.append(wanted)
+        else:
+            suffix = "." + wanted
+            found.extend(name for name in names if name.endswith(suffix))
+    return found
+
+
+def select_classes(names, relations, focus=None, depth=1, include=None, exclude=None):
+    """
+    Select the classes of a diagram around some focus classes, or by name.
+
+    With 'focus', a breadth first search over the 'adjacency_index' of the relations collects the classes at
+    most 'depth' relations away from a focus class, following relations in both directions. Classes not
+    matching 'include' or matching 'exclude' are left out and the search does not pass through them, but the
+    focus classes themselves are always kept.
+
+    Parameters:
+    - names (list): The class names of the diagram.
+    - relations (list): The 'Relation' records of the diagram.
+    - focus (list, optional): Names of the classes to centre on. A name without its module, or without its
+                              outer classes, also matches the classes drawn under a longer dotted name. Without
+                              focus classes, every class passing 'include' and 'exclude' is selected.
+    - depth (int, optional): How many relations away from the focus classes to go. Defaults to 1.
+    - include (list, optional): Regular expressions, at least one of which must match (anywhere in) the name of
+                                a selected class.
+    - exclude (list, optional): Regular expressions none of which may match the name of a selected class.
+
+    Returns:
+    - list: The selected class names, in the order of 'names'. Empty when no focus class is found.
+
+    Raises:
+    - re.error: If one of the regular expressions is invalid.
+    """
+    includePatterns = [re.compile(pattern) for pattern in include or ()]
+    excludePatterns = [re.compile(pattern) for pattern in exclude or ()]
+
+    def allowed(name):
+        if includePatterns and not any(pattern.search(name) for pattern in includePatterns):
+            return False
+        return not any(pattern.search(name) for pattern in excludePatterns)
+
+    if not focus:
+        return [name for name in names if allowed(name)]
+
+    known = set(names)
+    selected = set(_focus_names(known, focus))
+    index = adjacency_index(relations)
+    queue = deque((name, 0) for name in selected)
+    while queue:
+        name, distance = queue.popleft()
+        if distance >= depth:
+            continue
+        for neighbour in index.get(name, ()):
+            if neighbour not in selected and neighbour in known and allowed(neighbour):
+                selected.add(neighbour)
+                queue.append((neighbour, distance + 1))
+    return [name for name in names if name in selected]
@@ -0,0 +1,162 @@
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency, fall back to the 'array' based implementation
+    np = None
+
+# Side order matters: on equal distances the first pair in this order wins, as in 'closest_sides'
+SIDES = ("north", "south", "east", "west")
+
+
+class NodeRects:
+    """
+    The rectangles of all nodes of a diagram, held as numeric columns.
+
+    Node coordinates are parsed from their string form once, instead of once per relation and side as
+    'calculate_midpoint' does. The columns are NumPy arrays when NumPy is installed and 'array.array' objects
+    otherwise.
+
+    Attributes:
+    - index (dict): Maps each node name to its row in the columns.
+    - x, y, w, h: The integer coordinates and sizes of the nodes.
+    """
+
+    def __init__(self, nodeCoords):
+        """
+        Parameters:
+        - nodeCoords (dict): Maps node names to dictionaries with keys 'x', 'y', 'w' and 'h' (ints or strings).
+        """
+        self.index = {name: i for i, name in enumerate(nodeCoords)}
+        columns = {key: [int(node[key]) for node in nodeCoords.values()] for key in ("x", "y", "w", "h")}
+        if np is not None:
+            columns = {key: np.array(values, dtype=np.int64) for key, values in columns.items()}
+        else:
+            columns = {key: array("q", values) for key, values in columns.items()}
+        self.x, self.y, self.w, self.h = columns["x"], columns["y"], columns["w"], columns["h"]
+
+    def midpoints(self):
+        """
+        Computes the midpoint of every side of every node, in the order of 'SIDES'.
+
+        Returns:
+        - tuple: Two sequences (mx, my) of length 4 * number of nodes; the midpoint of side s of node i is at
+                 position 4 * i + s.
+        """
+        x, y, w, h = self.x, self.y, self.w, self.h
+        if np is not None:
+            mx = np.stack([x + w // 2, x + w // 2, x + w, x], axis=1).ravel()
+            my = np.stack([y, y + h, y + h // 2, y + h // 2], axis=1).ravel()
+            return mx, my
+        mx, my = array("q"), array("q")
+        for xi, yi, wi, hi in zip(x, y, w, h):
+            mx.extend((xi + wi // 2, xi + wi // 2, xi + wi, xi))
+            my.extend((yi, yi + hi, yi + hi // 2, yi + hi // 2))
+        return mx, my
+
+
+def closest_side_pairs(rects, sources, targets, chunk_size=65536):
+    """
+    Finds the closest pair of sides for every (source, target) pair of nodes in one pass.
+
+    This is the batched equivalent of calling 'closest_sides' for each relation: for each pair it picks the
+    sides whose midpoints are nearest to each other, breaking ties in the same order.
+
+    Parameters:
+    - rects (NodeRects): The node rectangles.
+    - sources (list): The row of the source node of each relation.
+    - targets (list): The row of the target node of each relation.
+    - chunk_size (int, optional): The number of relations handled per NumPy batch, bounding temporary memory.
+
+    Returns:
+    - tuple: Two lists (sides1, sides2) holding the side of the source and the side of the target node of
+             each relation, as indices into 'SIDES'.
+    """
+    if not sources:
+        return [], []
+    mx, my = rects.midpoints()
+    if np is not None:
+        mx, my = mx.reshape(-1, 4), my.reshape(-1, 4)
+        sources = np.asarray(sources, dtype=np.intp)
+        targets = np.asarray(targets, dtype=np.intp)
+        sides1, sides2 = [], []
+        for start in range(0, len(sources), chunk_size):
+            src, dst = sources[start:start + chunk_size], targets[start:start + chunk_size]
+            dx = mx[src][:, :, None] - mx[dst][:, None, :]
+            dy = my[src][:, :, None] - my[dst][:, None, :]
+            # Squared distances keep the comparison exact; argmin returns the first minimum like the serial scan
+            best = (dx * dx + dy * dy).reshape(len(src), 16).argmin(axis=1)
+            sides1.extend((best // 4).tolist())
+            sides2.extend((best % 4).tolist())
+        return sides1, sides2
+
+    sides1, sides2 = [], []
+    for src, dst in zip(sources, targets):
+        src, dst = 4 * src, 4 * dst
+        best, bestPair = None, 0
+        for side1 in range(4):
+            x1, y1 = mx[src + side1], my[src + side1]
+            for side2 in range(4):
+                dx, dy = x1 - mx[dst + side2], y1 - my[dst + side2]
+                distance = dx * dx + dy * dy
+                if best is None or distance < best:
+                    best, bestPair = distance, 4 * side1 + side2
+        sides1.append(bestPair // 4)
+        sides2.append(bestPair % 4)
+    return sides1, sides2
+
+
+def connection_anchors(rects, sources, targets, sides1, sides2):
+    """
+    Computes where each relation attaches to its source and target node.
+
+    Relations are numbered per node side in the order they are given, the source end of a relation before its
+    target end, and the n-th relation on a side is attached at n / (n + 1) of its length, exactly as the
+    arrow loop of 'create_xml_output' does with 'calculate_midpoint'.
+
+    Parameters:
+    - rects (NodeRects): The node rectangles.
+    - sources, targets (list): The rows of the source and target node of each relation.
+    - sides1, sides2 (list): The chosen sides, as returned by 'closest_side_pairs'.
+
+    Returns:
+    - tuple: Four lists (start_points, end_points, numbers1, numbers2) holding the (x, y) anchor on the source
+             and target node and the connection number of each end of every relation.
+    """
+    if not sources:
+        return [], [], [], []
+    counts = {}
+    numbers1, numbers2 = [], []
+    for src, dst, side1, side2 in zip(sources, targets, sides1, sides2):
+        key = 4 * src + side1
+        counts[key] = counts.get(key, 0) + 1
+        numbers1.append(counts[key])
+        key = 4 * dst + side2
+        counts[key] = counts.get(key, 0) + 1
+        numbers2.append(counts[key])
+
+    if np is not None:
+        def anchors(rows, sides, numbers):
+            rows, sides, numbers = np.asarray(rows, dtype=np.intp), np.asarray(sides), np.asarray(numbers)
+            x, y, w, h = rects.x[rows], rects.y[rows], rects.w[rows], rects.h[rows]
+            along_x = x + w // (numbers + 1) * numbers
+            along_y = y + h // (numbers + 1) * numbers
+            px = np.select([sides < 2, sides == 2], [along_x, x + w], x)
+            py = np.select([sides == 0, sides == 1], [y, y + h], along_y)
+            return list(zip(px.tolist(), py.tolist()))
+    else:
+        def anchors(rows, sides, numbers):
+            points = []
+            for row, side, number in zip(rows, sides, numbers):
+                x, y, w, h = rects.x[row], rects.y[row], rects.w[row], rects.h[row]
+                if side == 0:
+                    points.append((x + w // (number + 1) * number, y))
+                elif side == 1:
+                    points.append((x + w // (number + 1) * number, y + h))
+                elif side == 2:
+                    points.append((x + w, y + h // (number + 1) * number))
+                else:
+                    points.append((x, y + h // (number + 1) * number))
+            return points
+
+    return anchors(sources, sides1, numbers1), anchors(targets, sides2, numbers2), numbers1, numbers2
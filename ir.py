@@ -0,0 +1,129 @@
+import json
+import marshal
+import os
+import struct
+
+from model import as_class_infos, ClassInfo
+
+# Bump IR_VERSION whenever the layout of the IR changes; readers refuse files newer than they understand
+IR_FORMAT_NAME = "umlet-python-parser-ir"
+IR_VERSION = 3
+IR_FORMATS = ("json", "binary")
+# Binary files start with this magic and the IR version, followed by a 'marshal' dump of the same data as JSON
+_MAGIC = b"UMLIR\0"
+_HEADER = struct.Struct("<H")
+_MARSHAL_VERSION = 4
+
+
+def _as_tuples(value):
+    """Turn the lists JSON makes of tuples, such as ("List", "Entity") type annotations, back into tuples."""
+    if isinstance(value, list):
+        return tuple(_as_tuples(item) for item in value)
+    return value
+
+
+def _encode(entries):
+    files = []
+    for file_path, analysis_results, imported_modules, module in entries:
+        files.append({
+            "path": file_path,
+            "module": module,
+            "classes": [class_info.to_dict() for class_info in as_class_infos(analysis_results)],
+            "imports": list(imported_modules),
+        })
+    return {"format": IR_FORMAT_NAME, "version": IR_VERSION, "files": files}
+
+
+def _decode_class(data):
+    for attr in data.get("attributes", []):
+        attr["type"] = _as_tuples(attr.get("type"))
+    for method in data.get("methods", []):
+        method["return_type"] = _as_tuples(method.get("return_type"))
+        method["input_types"] = {arg: _as_tuples(argType) for arg, argType in method.get("input_types", {}).items()}
+    return ClassInfo.from_dict(data)
+
+
+def _decode(payload, path):
+    if not isinstance(payload, dict) or payload.get("format") != IR_FORMAT_NAME:
+        raise ValueError(f"{path} is not an analysis IR file")
+    version = payload.get("version")
+    if not isinstance(version, int) or version > IR_VERSION:
+        raise ValueError(f"{path} has IR version {version}, this version reads up to {IR_VERSION}")
+    try:
+        # Files before version 3 did not record the module, which is then derived from the path when rendering
+        return [(entry["path"], [_decode_class(data) for data in entry["classes"]],
+                 [_as_tuples(name) for name in entry["imports"]], entry.get("module"))
+                for entry in payload["files"]]
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"{path} is not a valid analysis IR file: {e!r}") from e
+
+
+def write_ir(path, entries, format=None):
+    """
+    Saves analysis results as an intermediate representation (IR) file, to be rendered later or elsewhere.
+
+    Parameters:
+    - path (str): The path of the IR file.
+    - entries (list): (file_path, analysis_results, imported_modules, module) tuples, one per analysed file,
+                      with the results as returned by 'analyze_python_file' and the name the file is imported
+                      by (see 'partition.import_name'), so that the IR can be rendered away from the files.
+    - format (str, optional): "json" for a readable file, or "binary" for a compact and faster to load
+                              'marshal' encoding. Defaults to "json" for paths ending in ".json" and to
+                              "binary" otherwise.
+
+    Raises:
+    - ValueError: If 'format' is not one of 'IR_FORMATS'.
+    """
+    if format is None:
+        format = "json" if path.lower().endswith(".json") else "binary"
+    if format not in IR_FORMATS:
+        raise ValueError(f"Unsupported IR format: {format}")
+    payload = _encode(entries)
+
+    # Write next to the target and move it in place, so a reader never sees half a file
+    tmpPath = f"{path}.{os.getpid()}.tmp"
+    try:
+        if format == "json":
+            with open(tmpPath, "w") as file:
+                json.dump(payload, file)
+        else:
+            with open(tmpPath, "wb") as file:
+                file.write(_MAGIC + _HEADER.pack(IR_VERSION) + marshal.dumps(payload, _MARSHAL_VERSION))
+        os.replace(tmpPath, path)
+    finally:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+
+
+def read_ir(path):
+    """
+    Loads an IR file written by 'write_ir', in either format.
+
+    Parameters:
+    - path (str): The path of the IR file.
+
+    Returns:
+    - list: (file_path, analysis_results, imported_modules, module) tuples, with the results as 'ClassInfo'
+            records. The module is None for files written before IR version 3.
+
+    Raises:
+    - OSError: If the file cannot be read.
+    - ValueError: If the file is not an IR file or was written by a newer, incompatible version.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    if data.startswith(_MAGIC):
+        offset = len(_MAGIC) + _HEADER.size
+        (version,) = _HEADER.unpack_from(data, len(_MAGIC))
+        if version > IR_VERSION:
+            raise ValueError(f"{path} has IR version {version}, this version reads up to {IR_VERSION}")
+        try:
+            payload = marshal.loads(data[offset:])
+        except (EOFError, ValueError, TypeError) as e:
+            raise ValueError(f"{path} is a damaged IR file: {e}") from e
+    else:
+        try:
+            payload = json.loads(data.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError(f"{path} is not an analysis IR file: {e}") from e
+    return _decode(payload, path)
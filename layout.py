@@ -0,0 +1,401 @@
+import math
+import random
+import time
+from collections import defaultdict, deque
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency, 'force_layout' falls back to a pure Python quadtree
+    np = None
+
+from model import NodeBox
+
+INHERITANCE = "Inherits from"
+
+
+def _arranged(boxes, positions):
+    """Build the layout result from a dict of name -> (x, y) positions."""
+    return {name: NodeBox(int(positions[name][0]), int(positions[name][1]), box['w'], box['h'])
+            for name, box in boxes.items()}
+
+
+def _assign_layers(names, parents):
+    """
+    Assign every node to a layer so that each node lies below all of its parents (longest path layering).
+
+    Cycles, which can only come from broken inheritance information, are broken by ignoring the edges that
+    close them.
+    """
+    children = defaultdict(list)
+    indegree = dict.fromkeys(names, 0)
+    for child, childParents in parents.items():
+        for parent in childParents:
+            children[parent].append(child)
+            indegree[child] += 1
+
+    layer = dict.fromkeys(names, 0)
+    queue = deque(name for name in names if indegree[name] == 0)
+    placed = 0
+    while placed < len(names):
+        if not queue:
+            # Only cycles are left; release the first unplaced node and carry on
+            stuck = next(name for name in names if indegree[name] > 0)
+            indegree[stuck] = 0
+            queue.append(stuck)
+        name = queue.popleft()
+        placed += 1
+        for child in children[name]:
+            if indegree[child] > 0:
+                layer[child] = max(layer[child], layer[name] + 1)
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    queue.append(child)
+    return layer
+
+
+def _reduce_crossings(layers, neighbours, sweeps):
+    """
+    Reorder the nodes inside each layer with the barycenter heuristic.
+
+    Every sweep moves through the layers top down and then bottom up, sorting each layer by the mean relative
+    position of the neighbours of its nodes. One sweep costs O(E + V log V).
+    """
+    position = {}
+    for layerNodes in layers:
+        for i, name in enumerate(layerNodes):
+            position[name] = i / max(1, len(layerNodes) - 1)
+
+    order = list(range(len(layers)))
+    for sweep in range(sweeps):
+        for index in (order if sweep % 2 == 0 else reversed(order)):
+            layerNodes = layers[index]
+            keys = {}
+            for name in layerNodes:
+                linked = neighbours[name]
+                keys[name] = sum(position[other] for other in linked) / len(linked) if linked else position[name]
+            layerNodes.sort(key=keys.__getitem__)
+            for i, name in enumerate(layerNodes):
+                position[name] = i / max(1, len(layerNodes) - 1)
+    return layers
+
+
+def layered_layout(boxes, relations, gap_x=50, gap_y=80, sweeps=4, max_row_width=None):
+    """
+    Arrange boxes in layers following the inheritance hierarchy (a Sugiyama style layout).
+
+    Base classes are placed above the classes that inherit from them: every class gets the layer one below its
+    lowest base class. The nodes inside each layer are then reordered with a few barycenter sweeps to reduce
+    crossing edges, and finally placed left to right. Layers wider than 'max_row_width' (typically the layer
+    of all classes without any inheritance) are wrapped onto several rows. Every step is linear or
+    O(n log n) in the number of classes and relations, so thousands of classes are laid out in well under a
+    second.
+
+    Parameters:
+    - boxes (dict): A dictionary of boxes, where each key is a class name and each value is a dictionary with
+                    keys 'w' (width) and 'h' (height).
+    - relations (list): The 'Relation' records collected by 'create_xml_output'. Only
+                        "Inherits from" relations between two of the boxes are used.
+    - gap_x (int, optional): The horizontal space between boxes. Defaults to 50.
+    - gap_y (int, optional): The vertical space between rows. Defaults to 80.
+    - sweeps (int, optional): The number of crossing reduction sweeps. Defaults to 4.
+    - max_row_width (int, optional): The width at which layers are wrapped. Defaults to a width that gives a
+                                     roughly square diagram.
+
+    Returns:
+    - dict: A dictionary with the same keys as 'boxes', where each value is a 'NodeBox' holding the position
+            and the original size of the box.
+    """
+    names = list(boxes)
+    if not names:
+        return {}
+
+    parents = defaultdict(list)
+    neighbours = defaultdict(list)
+    for relation in relations:
+        source, target = relation.source, relation.target
+        if relation.relation_type == INHERITANCE and source in boxes and target in boxes and source != target:
+            parents[source].append(target)
+            neighbours[source].append(target)
+            neighbours[target].append(source)
+
+    layer = _assign_layers(names, parents)
+    layers = [[] for _ in range(max(layer.values()) + 1)]
+    for name in names:
+        layers[layer[name]].append(name)
+    layers = _reduce_crossings(layers, neighbours, sweeps)
+
+    if max_row_width is None:
+        area = sum((int(box['w']) + gap_x) * (int(box['h']) + gap_y) for box in boxes.values())
+        widest = max(int(box['w']) for box in boxes.values())
+        max_row_width = max(widest, int(math.sqrt(area) * 1.5))
+
+    # Split the layers into rows no wider than max_row_width
+    rows = []
+    for layerNodes in layers:
+        row, rowWidth = [], 0
+        for name in layerNodes:
+            width = int(boxes[name]['w'])
+            if row and rowWidth + width > max_row_width:
+                rows.append((row, rowWidth - gap_x))
+                row, rowWidth = [], 0
+            row.append(name)
+            rowWidth += width + gap_x
+        if row:
+            rows.append((row, rowWidth - gap_x))
+
+    # Center every row under the widest one
+    diagramWidth = max(rowWidth for row, rowWidth in rows)
+    positions = {}
+    y = 0
+    for row, rowWidth in rows:
+        x = (diagramWidth - rowWidth) // 2
+        for name in row:
+            positions[name] = (x, y)
+            x += int(boxes[name]['w']) + gap_x
+        y += max(int(boxes[name]['h']) for name in row) + gap_y
+
+    return _arranged(boxes, positions)
+
+
+def _spread_bits(v):
+    """Spread the low 16 bits of each value so that a zero bit sits between every two bits (Morton order)."""
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    return (v | (v << 1)) & 0x55555555
+
+
+def _repulsion_numpy(px, py, k2, theta):
+    """
+    Barnes-Hut repulsive forces between all nodes, vectorised with NumPy.
+
+    The quadtree is implicit: nodes are sorted into cells by the Morton code of their quantised position, and the
+    cells of level l are the distinct prefixes of 2 * l bits. The tree is then walked for all nodes at once,
+    one level per step, keeping a frontier of (node, cell) pairs. A cell far enough away (size / distance <
+    theta) acts on the node through its centre of mass; a closer cell is replaced by its children. Each node
+    ends up interacting with O(log n) cells.
+    """
+    n = len(px)
+    minX, minY = px.min(), py.min()
+    extent = max(px.max() - minX, py.max() - minY, 1.0)
+    depth = int(min(16, max(1, math.ceil(math.log(n, 4)) + 2)))
+    scale = (2 ** depth - 1) / extent
+    keys = _spread_bits(((px - minX) * scale).astype(np.int64)) | (_spread_bits(((py - minY) * scale).astype(np.int64)) << 1)
+
+    levels = []
+    for level in range(depth + 1):
+        cellKeys, bodyCells = np.unique(keys >> (2 * (depth - level)), return_inverse=True)
+        mass = np.bincount(bodyCells, minlength=len(cellKeys)).astype(np.float64)
+        levels.append((cellKeys, bodyCells, mass,
+                       np.bincount(bodyCells, px, len(cellKeys)) / mass,
+                       np.bincount(bodyCells, py, len(cellKeys)) / mass))
+    children = []
+    for level in range(depth):
+        parents = np.searchsorted(levels[level][0], levels[level + 1][0] >> 2)
+        cells = np.arange(len(levels[level][0]))
+        children.append((np.searchsorted(parents, cells), np.searchsorted(parents, cells, side="right")))
+
+    fx, fy = np.zeros(n), np.zeros(n)
+    bodies, cells = np.arange(n), np.zeros(n, dtype=np.int64)
+    theta2 = theta * theta
+    for level in range(depth + 1):
+        _, bodyCells, mass, comX, comY = levels[level]
+        own = bodyCells[bodies] == cells
+        # A cell containing the node itself acts through the centre of mass of the other nodes only
+        m = mass[cells] - own
+        safeM = np.maximum(m, 1)
+        cx = np.where(own, (comX[cells] * mass[cells] - px[bodies] * own) / safeM, comX[cells])
+        cy = np.where(own, (comY[cells] * mass[cells] - py[bodies] * own) / safeM, comY[cells])
+        dx, dy = px[bodies] - cx, py[bodies] - cy
+        d2 = dx * dx + dy * dy
+        size = extent / 2 ** level
+        if level == depth:
+            accept = np.ones(len(bodies), dtype=bool)
+        else:
+            accept = ~own & (size * size < theta2 * d2)
+        use = accept & (m > 0) & (d2 > 0)
+        force = np.zeros(len(bodies))
+        force[use] = k2 * m[use] / d2[use]
+        fx += np.bincount(bodies, dx * force, n)
+        fy += np.bincount(bodies, dy * force, n)
+        if level == depth:
+            break
+
+        bodies, cells = bodies[~accept], cells[~accept]
+        start, end = children[level][0][cells], children[level][1][cells]
+        counts = end - start
+        total = int(counts.sum())
+        if not total:
+            break
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        bodies, cells = np.repeat(bodies, counts), np.repeat(start, counts) + offsets
+    return fx, fy
+
+
+class _QuadCell:
+    """A cell of the pure Python Barnes-Hut quadtree, used when NumPy is not installed."""
+
+    __slots__ = ("x0", "y0", "size", "mass", "sumX", "sumY", "children", "body")
+
+    def __init__(self, x0, y0, size):
+        self.x0, self.y0, self.size = x0, y0, size
+        self.mass, self.sumX, self.sumY = 0, 0.0, 0.0
+        self.children = None
+        self.body = None
+
+    def insert(self, body, x, y, depth=0):
+        self.mass += 1
+        self.sumX += x
+        self.sumY += y
+        if self.children is None:
+            if self.body is None and self.mass == 1:
+                self.body = (body, x, y)
+                return
+            if depth >= 24:
+                # Coincident nodes share a leaf
+                return
+            self.children = [None] * 4
+            if self.body is not None:
+                previous, self.body = self.body, None
+                self._child_insert(*previous, depth)
+        self._child_insert(body, x, y, depth)
+
+    def _child_insert(self, body, x, y, depth):
+        half = self.size / 2
+        east, south = x >= self.x0 + half, y >= self.y0 + half
+        index = east + 2 * south
+        if self.children[index] is None:
+            self.children[index] = _QuadCell(self.x0 + half * east, self.y0 + half * south, half)
+        self.children[index].insert(body, x, y, depth + 1)
+
+
+def _repulsion_python(px, py, k2, theta):
+    """Barnes-Hut repulsive forces between all nodes, using an explicit quadtree."""
+    n = len(px)
+    minX, minY = min(px), min(py)
+    extent = max(max(px) - minX, max(py) - minY, 1.0) * 1.0001
+    root = _QuadCell(minX, minY, extent)
+    for i in range(n):
+        root.insert(i, px[i], py[i])
+
+    theta2 = theta * theta
+    fx, fy = [0.0] * n, [0.0] * n
+    for i in range(n):
+        x, y = px[i], py[i]
+        stack = [root]
+        while stack:
+            cell = stack.pop()
+            if cell.body is not None and cell.body[0] == i:
+                continue
+            dx, dy = x - cell.sumX / cell.mass, y - cell.sumY / cell.mass
+            d2 = dx * dx + dy * dy
+            if cell.children is None or cell.size * cell.size < theta2 * d2:
+                if d2 > 0:
+                    force = k2 * cell.mass / d2
+                    fx[i] += dx * force
+                    fy[i] += dy * force
+            else:
+                stack.extend(child for child in cell.children if child is not None)
+    return fx, fy
+
+
+def force_layout(boxes, relations, iterations=100, time_budget=None, seed=0, theta=0.8, gravity=1.0):
+    """
+    Arrange boxes with a force-directed (Fruchterman-Reingold) layout.
+
+    Related classes attract each other, all classes repel each other, and a weak pull towards the centre keeps
+    unrelated groups together. Repulsion is approximated with a Barnes-Hut quadtree, so an iteration costs
+    O(n log n) instead of O(n^2); with NumPy installed the force updates of all nodes are computed as array
+    operations. Positions start from a seeded random placement, so the same input and seed always give the same
+    layout on the same installation (the NumPy and pure Python paths differ slightly in rounding).
+
+    Parameters:
+    - boxes (dict): A dictionary of boxes, where each key is a class name and each value is a dictionary with
+                    keys 'w' (width) and 'h' (height).
+    - relations (list): The 'Relation' records collected by 'create_xml_output'. Every
+                        relation between two different boxes pulls them together.
+    - iterations (int, optional): The maximum number of iterations. Defaults to 100.
+    - time_budget (float, optional): Stop after this many seconds even if iterations are left.
+    - seed (int, optional): The seed of the initial random placement. Defaults to 0.
+    - theta (float, optional): The Barnes-Hut accuracy parameter; smaller is more exact and slower.
+    - gravity (float, optional): The strength of the pull towards the centre.
+
+    Returns:
+    - dict: A dictionary with the same keys as 'boxes', where each value is a 'NodeBox' holding the position
+            and the original size of the box.
+    """
+    names = list(boxes)
+    n = len(names)
+    if not n:
+        return {}
+    index = {name: i for i, name in enumerate(names)}
+    edges = sorted({(index[relation.source], index[relation.target]) for relation in relations
+                    if relation.source in index and relation.target in index and relation.source != relation.target})
+
+    # The ideal distance between two related boxes grows with the size of the boxes
+    k = 1.5 * sum(math.sqrt(int(box['w']) * int(box['h'])) for box in boxes.values()) / n
+    k2 = k * k
+    rng = random.Random(seed)
+    spread = k * math.sqrt(n)
+    px = [rng.uniform(0, spread) for _ in range(n)]
+    py = [rng.uniform(0, spread) for _ in range(n)]
+
+    temperature = spread / 10
+    cooling = temperature / (iterations + 1)
+    deadline = time.perf_counter() + time_budget if time_budget is not None else None
+
+    if np is not None:
+        px, py = np.array(px), np.array(py)
+        sources = np.array([s for s, _ in edges], dtype=np.int64)
+        targets = np.array([t for _, t in edges], dtype=np.int64)
+        for _ in range(iterations):
+            if n > 1:
+                fx, fy = _repulsion_numpy(px, py, k2, theta)
+            else:
+                fx, fy = np.zeros(n), np.zeros(n)
+            if len(sources):
+                dx, dy = px[sources] - px[targets], py[sources] - py[targets]
+                pull = np.hypot(dx, dy) / k
+                fx += np.bincount(targets, dx * pull, n) - np.bincount(sources, dx * pull, n)
+                fy += np.bincount(targets, dy * pull, n) - np.bincount(sources, dy * pull, n)
+            fx -= gravity * (px - px.mean()) * k / spread
+            fy -= gravity * (py - py.mean()) * k / spread
+            length = np.maximum(np.hypot(fx, fy), 1e-9)
+            step = np.minimum(length, temperature) / length
+            px += fx * step
+            py += fy * step
+            temperature -= cooling
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+        px, py = px.tolist(), py.tolist()
+    else:
+        for _ in range(iterations):
+            if n > 1:
+                fx, fy = _repulsion_python(px, py, k2, theta)
+            else:
+                fx, fy = [0.0] * n, [0.0] * n
+            for s, t in edges:
+                dx, dy = px[s] - px[t], py[s] - py[t]
+                pull = math.hypot(dx, dy) / k
+                fx[s] -= dx * pull
+                fy[s] -= dy * pull
+                fx[t] += dx * pull
+                fy[t] += dy * pull
+            meanX, meanY = sum(px) / n, sum(py) / n
+            for i in range(n):
+                fxi = fx[i] - gravity * (px[i] - meanX) * k / spread
+                fyi = fy[i] - gravity * (py[i] - meanY) * k / spread
+                length = max(math.hypot(fxi, fyi), 1e-9)
+                step = min(length, temperature) / length
+                px[i] += fxi * step
+                py[i] += fyi * step
+            temperature -= cooling
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+
+    # Positions are box centres; shift so that every box lies in positive coordinates
+    left = min(px[i] - int(boxes[name]['w']) / 2 for i, name in enumerate(names))
+    top = min(py[i] - int(boxes[name]['h']) / 2 for i, name in enumerate(names))
+    positions = {name: (px[i] - int(boxes[name]['w']) / 2 - left, py[i] - int(boxes[name]['h']) / 2 - top)
+                 for i, name in enumerate(names)}
+    return _arranged(boxes, positions)
@@ -1,9 +1,33 @@
 import ast
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+import io
 import math
-import sys
 import os.path
+import sys
+import argparse
+import cProfile
+import functools
+import itertools
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from cache import AnalysisCache, read_source
+from crawl import iter_python_files
+from fastscan import HeaderScanError, header_source
+from uxf import UXFWriter, read_uxf
+from ir import IR_FORMATS, read_ir, write_ir
+from layout import layered_layout, force_layout
+from focus import select_classes
+from partition import PARTITION_MODES, import_name, module_name, partition_classes, safe_file_name
+from model import ClassInfo, MethodInfo, AttributeInfo, ClassBox, Relation, NodeBox, as_class_infos, intern, intern_type
+from instrumentation import StageProfiler, profile_stage
+from geometry import NodeRects, SIDES, closest_side_pairs, connection_anchors
+from routing import ROUTING_STYLES, OrthogonalRouter
+from watch import FileWatcher
+
+# Version of the dictionaries returned by 'analyze_python_file'. Bump it whenever their shape or content
+# changes so that persisted analyses from older versions are ignored.
+ANALYSIS_SCHEMA_VERSION = 5
 
 def arrange_boxes(boxes, shape):
     """
@@ -80,6 +104,29 @@ def arrange_boxes(boxes, shape):
 
     return arranged_boxes
 
+def polygon_layout(boxes, relations):
+    """
+    The default layout engine: place every box on the vertices of one regular polygon with 'arrange_boxes'.
+
+    Parameters:
+    - boxes (dict): A dictionary of boxes keyed by class name, with keys 'w' (width) and 'h' (height).
+    - relations (list): The 'Relation' records of the diagram. Not used by this engine.
+
+    Returns:
+    - dict: The arranged boxes, as returned by 'arrange_boxes'.
+    """
+    if not boxes:
+        return {}
+    return arrange_boxes(boxes, len(boxes))
+
+# Layout engines selectable with '--layout'. Each one takes the boxes and relations of a diagram and returns the 
+# boxes with their 'x' and 'y' positions filled in.
+LAYOUT_ENGINES = {
+    "polygon": polygon_layout,
+    "layered": layered_layout,
+    "force": force_layout,
+}
+
 # Function to calculate the midpoint of a side
 def calculate_midpoint(node, side, connectionNumber=None, totalConnections=None):
     """
@@ -186,111 +233,105 @@ def flatten_list(nested_list):
             flat_list.append(element)
     return flat_list
 
-def length_of_longest_element(class_info):
+# Approximate size of the text of a class box in UMLet at the default zoom level
+BOX_CHARACTER_WIDTH = 10
+BOX_LINE_HEIGHT = 16
+BOX_SEPARATOR_HEIGHT = 10
+BOX_PADDING = 10
+BOX_MIN_WIDTH = 210
+
+def render_class_box(class_info):
     """
-    Calculate the length of the longest element in a class's information.
+    Renders the box of a class: the text of its UMLet properties panel and the size needed to show it.
 
-    This function takes a dictionary representing various elements of a class (such as class name, docstring,
-    methods, attributes, and base classes) and calculates the length of the longest string representation 
-    among these elements. This includes the longest line in multi-line strings (like docstrings), the full 
-    representation of methods (including arguments and return type), and attributes (including type).
+    Every attribute and method line is formatted exactly once, and both the panel text and the box size are 
+    derived from those lines. The result is cached on the record ('class_info.rendered'), so rendering the 
+    same class again, e.g. for the merged diagram after its own per-file diagram, costs nothing. The width 
+    fits the longest line shown in the box, the height its number of lines, counting each line of a multi-line 
+    docstring.
 
     Parameters:
-    - class_info (dict): A dictionary containing the class's information. The dictionary should have keys 
-                         'class_name', 'docstring', 'methods', 'attributes', and 'base_classes'. Each method 
-                         and attribute should have its own 'docstring', 'input_types', 'return_type', etc.
+    - class_info (ClassInfo): The class's information, with its 'MethodInfo' and 'AttributeInfo' records.
 
     Returns:
-    - int: The length of the longest string representation among the class's elements.
+    - ClassBox: The panel text, the length of the longest line shown and the box's width and height.
 
     Example:
-    >>> class_info = {
-            'class_name': 'MyClass',
-            'docstring': 'A sample class.',
-            'methods': [{'name': 'my_method', 'input_types': {'param1': 'int'}, 'return_type': 'str', 'docstring': 'A method.'}],
-            'attributes': [{'name': 'my_attr', 'type': 'int'}],
-            'base_classes': ['BaseClass']
-        }
-    >>> length_of_longest_element(class_info)
-    28
+    >>> box = render_class_box(ClassInfo(class_name='MyClass', attributes=[AttributeInfo(name='my_attr', type='int')]))
+    >>> print(box.panel_attributes)
+    style=wordwrap
+    <<Class>>
+    MyClass
+    --
+    *Attributes*
+    - my_attr: int
+    --
+    *Functions*
+    >>> box.w, box.h
+    (210, 120)
     """
-    max_length = len(class_info['class_name'])
-
-    # Function to get the maximum length of lines in a multi-line string
-    def max_line_length(multi_line_str):
-        return max(len(line) for line in multi_line_str.split('\n'))
-
-    if class_info['docstring']:
-        max_length = max(max_length, max_line_length(class_info['docstring']))
-
-    for method in class_info['methods']:
-        argument_list = []
-        for arg, arg_type in method['input_types'].items():
-            arg_representation = f"{arg}: {arg_type}" if arg_type else arg
-            argument_list.append(arg_representation)
-
-        arguments = ', '.join(argument_list)
-        method_representation = f"{method['name']}({arguments}): {method['return_type'] or 'Any'}"
-        max_length = max(max_length, len(method_representation))
-
-        if method['docstring']:
-            max_length = max(max_length, max_line_length(method['docstring']))
+    if class_info.rendered is not None:
+        return class_info.rendered
+
+    lines = ["style=wordwrap", "<<Class>>", class_info.class_name]
+    if class_info.docstring:
+        lines.append(f"{{Doc string: {class_info.docstring}}}")
+    lines += ["--", "*Attributes*"]
+    for attr in class_info.attributes:
+        lines.append(f"- {attr.name}: {attr.type or 'None'}")
+        if attr.docstring:  # If attribute docstrings are available
+            lines.append(f"={{Doc string: {attr.docstring}}}")
+    lines += ["--", "*Functions*"]
+    for method in class_info.methods:
+        arguments = ', '.join(f"{arg}: {arg_type}" if arg_type else arg for arg, arg_type in method.input_types.items())
+        lines.append(f"- {method.name}({arguments}): {method.return_type or 'Any'}")
+        if method.docstring:
+            lines.append(f"={{Doc string: {method.docstring}}}")
+    panel_attributes = "\n".join(lines) + "\n"
+
+    # Measure what UMLet shows, which is every line after the style directive; docstrings may span several lines
+    longest_line = 0
+    height = BOX_PADDING
+    for line in panel_attributes.split("\n")[1:-1]:
+        if line == "--":
+            height += BOX_SEPARATOR_HEIGHT
+        else:
+            height += BOX_LINE_HEIGHT
+            longest_line = max(longest_line, len(line))
+    width = max(BOX_MIN_WIDTH, longest_line * BOX_CHARACTER_WIDTH)
+    # UMLet snaps elements to a 10 pixel grid
+    height = -(-height // 10) * 10
 
-    for attr in class_info['attributes']:
-        attr_representation = f"{attr['name']}: {attr['type'] or 'Any'}"
-        max_length = max(max_length, len(attr_representation))
+    class_info.rendered = ClassBox(panel_attributes, longest_line, width, height)
+    return class_info.rendered
 
-        if 'docstring' in attr:
-            max_length = max(max_length, max_line_length(attr['docstring']))
+def length_of_longest_element(class_info):
+    """
+    Calculate the length of the longest line shown in the box of a class.
 
-    if class_info['base_classes']:
-        base_classes_representation = ', '.join(class_info['base_classes'])
-        max_length = max(max_length, len(base_classes_representation))
+    Parameters:
+    - class_info (ClassInfo): The class's information, with its 'MethodInfo' and 'AttributeInfo' records.
 
-    return max_length
+    Returns:
+    - int: The length of the longest line, as measured by 'render_class_box'.
+    """
+    return render_class_box(class_info).longest_line
 
 def format_class_details(class_info):
     """
     Generate a formatted string representation of class details for XML documentation.
 
-    This function takes a dictionary containing information about a class, including its name, 
-    docstring, attributes, and methods. It formats this information into a structured string 
-    suitable for XML documentation. The resulting string includes the class name, its docstring 
-    (if available), a list of attributes with their types and docstrings, and a list of methods 
-    with their signatures and docstrings.
+    The resulting string includes the class name, its docstring (if available), a list of attributes with 
+    their types and docstrings, and a list of methods with their signatures and docstrings. It is the panel 
+    text rendered by 'render_class_box'.
 
     Parameters:
-    - class_info (dict): A dictionary containing the class's information. Expected keys are 
-                         'class_name', 'docstring', 'attributes', and 'methods'. Each attribute 
-                         and method can have its own 'docstring', 'input_types', 'return_type', etc.
+    - class_info (ClassInfo): The class's information, with its 'MethodInfo' and 'AttributeInfo' records.
 
     Returns:
     - str: A formatted string containing the class details, suitable for XML documentation.
     """
-
-    details = f"style=wordwrap\n"
-    details += f"<<Class>>\n{class_info['class_name']}\n"
-    if class_info['docstring']:
-        details += f"{{Doc string: {class_info['docstring']}}}\n"
-    details += "--\n*Attributes*\n"
-    for attr in class_info['attributes']:
-        details += f"- {attr['name']}: {attr['type'] or 'None'}\n"
-        if 'docstring' in attr:  # If attribute docstrings are available
-            details += f"={{Doc string: {attr['docstring']}}}\n"
-    details += "--\n*Functions*\n"
-    for method in class_info['methods']:
-        argument_list = []
-        for arg, arg_type in method['input_types'].items():
-            arg_representation = f"{arg}: {arg_type}" if arg_type else arg
-            argument_list.append(arg_representation)
-
-        arguments = ', '.join(argument_list)
-        ret_type = method['return_type'] or 'Any'
-        
-        details += f"- {method['name']}({arguments}): {ret_type}\n"
-        if method['docstring']:
-            details += f"={{Doc string: {method['docstring']}}}\n"
-    return details
+    return render_class_box(class_info).panel_attributes
 
 def format_docstring(docstring, max_line_length=40):
     """
@@ -310,30 +351,40 @@ def format_docstring(docstring, max_line_length=40):
     - str: The formatted docstring with line breaks inserted to comply with the maximum line length.
     """
     words = docstring.split()
-    formatted_docstring = ''
+    # remaining[i] is the length of ' '.join(words[i:]), kept as running suffix sums so that checking the 
+    # length of the rest of the docstring does not rebuild it for every line break
+    remaining = [0] * (len(words) + 1)
+    for i in range(len(words) - 1, -1, -1):
+        remaining[i] = remaining[i + 1] + len(words[i]) + (1 if i + 1 < len(words) else 0)
+
+    parts = []
     current_line_length = 0
 
     for i, word in enumerate(words):
         # Check if adding the next word would exceed the max line length
         if current_line_length + len(word) > max_line_length:
             # Check if the remaining text is more than half the max line length
-            remaining_text = ' '.join(words[i:])
-            if len(remaining_text) > max_line_length / 2:
-                formatted_docstring += '\n'  # Start a new line
+            if remaining[i] > max_line_length / 2:
+                parts.append('\n')  # Start a new line
                 current_line_length = 0
-            elif formatted_docstring:
+            elif parts:
                 # Add a space if it's not the start of the docstring
-                formatted_docstring += ' '
+                parts.append(' ')
 
-        elif formatted_docstring:
+        elif parts:
             # Add a space before the word if it's not the start of the docstring
-            formatted_docstring += ' '
+            parts.append(' ')
             current_line_length += 1
 
-        formatted_docstring += word
+        parts.append(word)
         current_line_length += len(word)
 
-    return formatted_docstring
+    return ''.join(parts)
+
+# Docstrings repeat across inherited overrides and the files of a project, so the analysis formats them through 
+# a bounded cache keyed by (docstring, max_line_length). Call 'format_docstring' directly to bypass it.
+DOCSTRING_CACHE_SIZE = 4096
+cached_format_docstring = functools.lru_cache(maxsize=DOCSTRING_CACHE_SIZE)(format_docstring)
 
 def get_function_argument_types(function_def):
     """
@@ -355,15 +406,15 @@ def get_function_argument_types(function_def):
     Note:
     - The function assumes that the input is an AST node of type FunctionDef. It is not designed to 
       handle other types of nodes.
-    - For complex type annotations that cannot be directly accessed using 'id', this function converts 
-      the AST node of the annotation into a string for representation.
+    - For complex type annotations that are not a plain or dotted name, this function converts the AST node 
+      of the annotation into a string for representation.
     """
     argument_types = {}
     for arg in function_def.args.args:
         # Check if the argument has a type annotation
         if arg.annotation:
-            # The type name can be directly accessed using 'id' for simple types
-            arg_type = getattr(arg.annotation, 'id', None)
+            # Simple types are a name, or a name reached through its module like models.User
+            arg_type = dotted_name(arg.annotation)
             if not arg_type:
                 # For more complex types (like List[int]), you may need more complex logic
                 arg_type = str(ast.dump(arg.annotation))
@@ -373,16 +424,28 @@ def get_function_argument_types(function_def):
 
     return argument_types
 
+def dotted_name(node):
+    """The name a 'Name' node or a chain of attributes like 'models.User' spells, or None for other nodes."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        owner = dotted_name(node.value)
+        return f"{owner}.{node.attr}" if owner is not None else None
+    return None
+
 def get_type_annotation(annotation_node):
     """Extract type annotation from an AST node."""
     if isinstance(annotation_node, ast.Name):
         return annotation_node.id
+    elif isinstance(annotation_node, ast.Attribute) and dotted_name(annotation_node) is not None:
+        # For types named through their module, like models.User
+        return dotted_name(annotation_node)
     elif isinstance(annotation_node, ast.Subscript):
         # For complex types like List[entity]
         base_type = get_type_annotation(annotation_node.value)
         
-        if isinstance(annotation_node.slice, ast.Name):
-            element_type = annotation_node.slice.id
+        element_type = dotted_name(annotation_node.slice)
+        if element_type is not None:
             return (base_type, element_type)
         else:
             return base_type
@@ -404,7 +467,10 @@ class ImportCollector(ast.NodeVisitor):
     - imports (list): A list where each element represents an import in the code. For simple imports, 
                       the element is a string representing the imported module's name. For imports from a 
                       specific module, the element is a tuple (module, name), where 'module' is the name 
-                      of the module and 'name' is the name of the imported object.
+                      of the module and 'name' is the name of the imported object. Relative imports keep 
+                      their leading dots in 'module', e.g. ".models" or ".". Imports renamed with 'as' 
+                      carry the alias as a third element: (module, name, alias) for 'from' imports and 
+                      (module, None, alias) for simple imports.
     """
 
     def __init__(self):
@@ -424,7 +490,10 @@ class ImportCollector(ast.NodeVisitor):
         - node (ast.Import): The AST node representing an 'import' statement.
         """
         for alias in node.names:
-            self.imports.append(alias.name)
+            if alias.asname:
+                self.imports.append((alias.name, None, alias.asname))
+            else:
+                self.imports.append(alias.name)
 
     def visit_ImportFrom(self, node):
         """
@@ -437,12 +506,429 @@ class ImportCollector(ast.NodeVisitor):
         Parameters:
         - node (ast.ImportFrom): The AST node representing a 'from ... import ...' statement.
         """
-        module = node.module
+        module = "." * (node.level or 0) + (node.module or "")
         for alias in node.names:
-            self.imports.append((module, alias.name))
+            if alias.asname:
+                self.imports.append((module, alias.name, alias.asname))
+            else:
+                self.imports.append((module, alias.name))
+
+
+# The nodes 'AnalysisVisitor' descends into: statements and the clauses of 'try' and 'match' blocks holding them
+_STATEMENT_CONTAINERS = (ast.stmt, ast.excepthandler) + ((ast.match_case,) if hasattr(ast, "match_case") else ())
+
+class AnalysisVisitor(ImportCollector):
+    """
+    A single pass AST visitor collecting everything the diagrams need from a module.
+
+    One traversal gathers the imports (through 'ImportCollector'), the classes with their docstrings, base 
+    classes, methods and attributes. Each docstring is looked up once. Besides the methods and class level 
+    assignments of a class body, the visitor picks up 'async def' methods, classes nested in classes or 
+    functions, and the 'self.x' attributes assigned in '__init__'. Subclasses can extend the extraction by 
+    overriding 'visit_*' methods or 'method_info' / 'attribute_infos', as long as they keep the scope handling 
+    of 'visit_ClassDef' and 'visit_FunctionDef' by calling them.
+
+    Attributes:
+    - imports (list): The imports, as collected by 'ImportCollector'.
+    - classes (list): 'ClassInfo' records of the classes in the order their definitions start. Nested classes 
+                      are named by their qualified name, as in '__qualname__', e.g. "Outer.Inner".
+    """
+
+    def __init__(self):
+        """
+        Initializes the visitor with empty import and class lists.
+        """
+        super().__init__()
+        self.classes = []
+        self._scope = []
+
+    def visit_ClassDef(self, node):
+        """
+        Records a class with its methods and attributes, then visits its body for nested classes and imports.
+
+        Parameters:
+        - node (ast.ClassDef): The AST node of the class definition.
+        """
+        docstring = ast.get_docstring(node)
+        class_info = ClassInfo(
+            class_name=intern(".".join(self._scope + [node.name])),
+            docstring=cached_format_docstring(docstring) if docstring else str(),
+            base_classes=[intern(dotted_name(base)) for base in node.bases if dotted_name(base) is not None]
+        )
+        initializer = None
+        for item in node.body:
+            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                class_info.methods.append(self.method_info(item))
+                if item.name == "__init__":
+                    initializer = item
+            elif isinstance(item, (ast.AnnAssign, ast.Assign)):
+                class_info.attributes.extend(self.attribute_infos(item))
+
+        if initializer is not None:
+            # Instance attributes only add to what the class body declares
+            declared = {attr.name for attr in class_info.attributes}
+            for attr_info in self.instance_attribute_infos(initializer):
+                if attr_info.name not in declared:
+                    declared.add(attr_info.name)
+                    class_info.attributes.append(attr_info)
+
+        self.classes.append(class_info)
+        self._scope.append(node.name)
+        self.generic_visit(node)
+        self._scope.pop()
+
+    def visit_FunctionDef(self, node):
+        """
+        Visits the body of a function for nested classes and imports, naming nested classes like '__qualname__'.
+
+        Parameters:
+        - node (ast.FunctionDef or ast.AsyncFunctionDef): The AST node of the function definition.
+        """
+        self._scope.extend((node.name, "<locals>"))
+        self.generic_visit(node)
+        del self._scope[-2:]
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def generic_visit(self, node):
+        """
+        Visits the statements nested in a node, such as the bodies of 'if', 'try' or 'with' blocks.
+
+        Imports, classes and functions are statements, so expressions are never descended into, which skips 
+        most of the nodes of a typical syntax tree.
+        """
+        for _, value in ast.iter_fields(node):
+            if type(value) is list:
+                for item in value:
+                    if isinstance(item, _STATEMENT_CONTAINERS):
+                        self.visit(item)
+
+    def method_info(self, node):
+        """
+        Builds the record of a method.
+
+        Parameters:
+        - node (ast.FunctionDef or ast.AsyncFunctionDef): The AST node of the method definition.
+
+        Returns:
+        - MethodInfo: The method's name, return type, docstring and argument types.
+        """
+        if isinstance(node.returns, ast.Subscript):
+            return_type = get_type_annotation(node.returns)
+        else:
+            return_type = dotted_name(node.returns)
+        docstring = ast.get_docstring(node)
+        return MethodInfo(
+            name=intern(node.name),
+            return_type=intern_type(return_type) if node.returns else None,
+            docstring=cached_format_docstring(docstring) if docstring else str(),
+            input_types={intern(arg): intern_type(argType) for arg, argType in get_function_argument_types(node).items()}
+        )
+
+    def attribute_infos(self, node):
+        """
+        Builds the records of the attributes a class level assignment defines.
 
+        Parameters:
+        - node (ast.Assign or ast.AnnAssign): The AST node of the assignment.
 
-def analyze_python_file(file_path):
+        Returns:
+        - list: 'AttributeInfo' records. For an annotated assignment the type is the annotation, otherwise it is 
+                the name assigned from, if any.
+        """
+        attr_name = None
+        attr_type = None
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    attr_name = target.id
+                    attr_type = getattr(node.value, 'id', None)
+        else:
+            attr_name = getattr(node.target, 'id', None)
+            attr_type = get_type_annotation(node.annotation)
+        if attr_name is None:
+            return []
+        return [AttributeInfo(name=intern(attr_name), type=intern_type(attr_type or str()))]
+
+    def instance_attribute_infos(self, node):
+        """
+        Builds the records of the 'self.x' attributes an '__init__' method assigns.
+
+        Assignments anywhere in the method count, except inside nested functions and classes. The type of an 
+        attribute is its annotation, the annotation of the argument it is assigned from, or the class it is 
+        assigned an instance of, e.g. "Entity" for 'self.owner = Entity()'.
+
+        Parameters:
+        - node (ast.FunctionDef or ast.AsyncFunctionDef): The AST node of the '__init__' method.
+
+        Returns:
+        - list: 'AttributeInfo' records, in the order the attributes are first assigned.
+        """
+        arguments = node.args.posonlyargs + node.args.args
+        if not arguments:
+            return []
+        self_name = arguments[0].arg
+        argument_types = {arg.arg: arg.annotation for arg in arguments + node.args.kwonlyargs if arg.annotation}
+
+        def is_self_attribute(target):
+            return (isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name)
+                    and target.value.id == self_name)
+
+        attributes = {}
+        statements = deque(node.body)
+        while statements:
+            statement = statements.popleft()
+            if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                continue
+            if isinstance(statement, ast.AnnAssign) and is_self_attribute(statement.target):
+                attr_type = get_type_annotation(statement.annotation)
+                if not attributes.get(statement.target.attr):
+                    attributes[statement.target.attr] = attr_type
+            elif isinstance(statement, ast.Assign):
+                value = statement.value
+                if isinstance(value, ast.Name) and value.id in argument_types:
+                    attr_type = get_type_annotation(argument_types[value.id])
+                elif isinstance(value, ast.Call) and dotted_name(value.func) is not None:
+                    attr_type = dotted_name(value.func)
+                else:
+                    attr_type = None
+                targets = list(statement.targets)
+                while targets:
+                    target = targets.pop(0)
+                    if isinstance(target, (ast.Tuple, ast.List)):
+                        # 'self.a, self.b = ...' unpacks, so the value says nothing about the types
+                        targets[:0] = target.elts
+                        attr_type = None
+                    elif is_self_attribute(target):
+                        attributes.setdefault(target.attr, attr_type)
+            # Visit nested blocks (if, for, with, try, ...) in source order
+            statements.extendleft(reversed([child for child in ast.iter_child_nodes(statement)
+                                            if isinstance(child, ast.stmt)]))
+        return [AttributeInfo(name=intern(name), type=intern_type(attr_type or str()))
+                for name, attr_type in attributes.items()]
+
+
+class SymbolIndex:
+    """
+    A project-wide lookup table of the classes and imports known to a diagram.
+
+    Classes are indexed by their fully qualified name: the name their file is imported by (see 
+    'partition.import_name') followed by their own, possibly nested, name, e.g. "pkg.models.User". Every module 
+    has a scope binding the names usable inside it: its top level classes, and everything it imports, with 
+    'from x import Y', relative imports and 'as' aliases turned into the qualified names they stand for. 
+    'resolve' looks a class name up in the scope of the module using it, following re-exports such as a 
+    package '__init__.py' importing a class from one of its modules, so each lookup costs a few dictionary 
+    accesses. Names no import accounts for fall back to a class of that name anywhere in the index, as classes 
+    may refer to others through string annotations without importing them.
+
+    An index can be grown file by file with 'add', which lets the per-file analyses of a multi-file run be 
+    folded into the index of the merged diagram as they arrive instead of being rescanned at the end.
+
+    Attributes:
+    - classes (dict): Maps each qualified class name to its 'ClassInfo' record. When a name is defined more 
+                      than once, the first definition wins.
+    - scopes (dict): Maps each module name to its scope, a dict from the names bound in the module to the 
+                     qualified names they refer to (None for relative imports that cannot be resolved). 
+                     Classes added without a file path share the scope of the module None.
+    - dependents (dict): The reverse module dependency graph. Maps each imported module, and each name imported 
+                         from a module, to the set of modules of the index importing it.
+    """
+
+    # Re-exports followed by 'resolve' before giving up, which also stops cyclic imports
+    MAX_REEXPORTS = 16
+
+    def __init__(self, analysis_results=(), imported_modules=(), file_path=None, module=None):
+        """
+        Builds an index of the given analysis results and imports.
+
+        Parameters:
+        - analysis_results (list, optional): 'ClassInfo' records as returned by 'analyze_python_file'.
+        - imported_modules (list, optional): Imports as returned by 'analyze_python_file'.
+        - file_path (str, optional): The path of the analysed file, see 'add'.
+        - module (str, optional): The name the analysed file is imported by, see 'add'.
+        """
+        self.classes = {}
+        self.scopes = {}
+        self.dependents = {}
+        # Bare class names to the qualified names defining them, and records to their module
+        self._qualified_names = {}
+        self._modules = {}
+        self.add(analysis_results, imported_modules, file_path, module)
+
+    def add(self, analysis_results=(), imported_modules=(), file_path=None, module=None):
+        """
+        Adds the classes and imports of one more analysis to the index.
+
+        Parameters:
+        - analysis_results (list, optional): 'ClassInfo' records as returned by 'analyze_python_file'.
+        - imported_modules (list, optional): Imports as returned by 'analyze_python_file'.
+        - file_path (str, optional): The path of the analysed file. It gives the module of its classes and the 
+                                     package its relative imports are resolved against. Without it the classes 
+                                     are indexed by their bare names and relative imports are left unresolved.
+        - module (str, optional): The name the file is imported by, when it was recorded while analysing it, as 
+                                  in an IR file. Without it the name is derived from the packages around 
+                                  'file_path' on disk (see 'partition.import_name'), which only holds where the 
+                                  files were analysed.
+        """
+        if module is None and file_path:
+            module = import_name(file_path)
+        if module is None:
+            package = None
+        elif file_path and os.path.basename(file_path) == "__init__.py":
+            package = module
+        else:
+            package = module.rpartition(".")[0]
+        scope = self.scopes.setdefault(module, {})
+
+        for iterClass in analysis_results:
+            name = iterClass.class_name
+            qualified = intern(f"{module}.{name}") if module else name
+            self._modules[id(iterClass)] = (iterClass, module)
+            if qualified not in self.classes:
+                self.classes[qualified] = iterClass
+                self._qualified_names.setdefault(name, []).append(qualified)
+            if "." not in name:
+                # Classes are defined after the imports they might shadow
+                scope[name] = qualified
+
+        for entry in imported_modules or []:
+            if isinstance(entry, str):
+                # 'import a.b' binds 'a'
+                source, boundName, target = entry, entry.partition(".")[0], entry.partition(".")[0]
+            else:
+                source, name, alias = tuple(entry) + (None,) * (3 - len(entry))
+                source = self._absolute_module(source, package)
+                if name is None:
+                    boundName, target = alias, source
+                else:
+                    boundName = alias or name
+                    target = None if source is None else (f"{source}.{name}" if source else name)
+            scope.setdefault(boundName, target)
+            if module is not None and source:
+                self.dependents.setdefault(source, set()).add(module)
+                if target and target != source:
+                    self.dependents.setdefault(target, set()).add(module)
+
+    @staticmethod
+    def _absolute_module(source, package):
+        """The absolute name of the module of a 'from' import, or None for a relative import without a package."""
+        if source is None or not source.startswith("."):
+            return source
+        if package is None:
+            return None
+        level = len(source) - len(source.lstrip("."))
+        parts = package.split(".") if package else []
+        if level - 1 > len(parts):
+            return None
+        return ".".join(parts[:len(parts) - level + 1] + ([source[level:]] if source[level:] else []))
+
+    def resolve(self, name, module=None):
+        """
+        Resolves a class name as it is written in a module to the qualified name of a class of the index.
+
+        Parameters:
+        - name (str): The name, bare or dotted like "models.User".
+        - module (str, optional): The module the name is used in, as returned by 'module_of'.
+
+        Returns:
+        - str or None: The qualified name of the class, or None when the name is not a class of the index, e.g. 
+                       because it was imported from elsewhere.
+        """
+        if type(name) is not str:
+            return None
+        scope = self.scopes.get(module, {})
+        if name in scope:
+            target = scope[name]
+            if target in self.classes:
+                return target
+            return self._follow(target) if target is not None else None
+        if "." in name:
+            head, _, rest = name.partition(".")
+            if head in scope:
+                target = scope[head]
+                return self._follow(f"{target}.{rest}") if target is not None else None
+            if name in self.classes:
+                return name
+        candidates = self._qualified_names.get(name)
+        return candidates[0] if candidates else None
+
+    def _follow(self, qualified):
+        # A name that is not a class may be re-exported by the module it was imported from
+        for _ in range(self.MAX_REEXPORTS):
+            if qualified in self.classes:
+                return qualified
+            module, _, name = qualified.rpartition(".")
+            while module and module not in self.scopes:
+                module, _, outer = module.rpartition(".")
+                name = f"{outer}.{name}"
+            if not module:
+                return None
+            head, dot, rest = name.partition(".")
+            target = self.scopes[module].get(head)
+            if target is None or target == f"{module}.{head}":
+                return None
+            qualified = target + dot + rest
+        return None
+
+    def module_of(self, class_info):
+        """The module a record was added with, or None."""
+        entry = self._modules.get(id(class_info))
+        return entry[1] if entry is not None and entry[0] is class_info else None
+
+    def qualified_name(self, class_info):
+        """The qualified name of a record of the index."""
+        module = self.module_of(class_info)
+        return f"{module}.{class_info.class_name}" if module else class_info.class_name
+
+    def display_name(self, qualified):
+        """
+        The name a class is shown and keyed by in a diagram: its bare name, or its qualified name when classes of 
+        other modules share its bare name.
+        """
+        class_info = self.classes.get(qualified)
+        if class_info is None or len(self._qualified_names.get(class_info.class_name, ())) > 1:
+            return qualified
+        return class_info.class_name
+
+    def diagram_classes(self, analysis_results):
+        """
+        Renames the records whose bare name is shared with classes of other modules to their 'display_name'.
+
+        Returns:
+        - list: The records, with copies in place of the renamed ones.
+        """
+        named = []
+        for iterClass in analysis_results:
+            name = self.display_name(self.qualified_name(iterClass))
+            if name != iterClass.class_name:
+                iterClass = ClassInfo(name, iterClass.docstring, iterClass.methods, iterClass.attributes,
+                                      iterClass.base_classes)
+            named.append(iterClass)
+        return named
+
+    def dependents_of(self, module):
+        """
+        The modules of the index importing 'module', directly or through other modules, nearest first.
+
+        Parameters:
+        - module (str): A module name, as returned by 'partition.import_name'.
+
+        Returns:
+        - list: The names of the dependent modules.
+        """
+        found = []
+        seen = {module}
+        queue = deque([module])
+        while queue:
+            for dependent in sorted(self.dependents.get(queue.popleft(), ())):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    found.append(dependent)
+                    queue.append(dependent)
+        return found
+
+
+def analyze_python_file(file_path, fast=False, source=None):
     """
     Analyzes a Python file to collect information about its classes and imported modules.
 
@@ -455,73 +941,272 @@ def analyze_python_file(file_path):
 
     Parameters:
     - file_path (str): The path to the Python file to be analyzed.
+    - fast (bool, optional): Only parse the class and function headers, docstrings and '__init__' methods 
+                             found by 'header_source', skipping all other function bodies. Classes and imports 
+                             inside those bodies are then missed. Files the header scanner cannot follow are 
+                             parsed in full. Defaults to False.
+    - source (bytes, optional): The content of the file, when it was already read, for instance with 
+                                'cache.read_source'. Defaults to reading 'file_path'.
 
     Returns:
-    - tuple: A tuple where the first element is a list of dictionaries, each representing a class in the 
-             analyzed file. The second element is a flattened list of imported modules. Each dictionary 
-             for a class contains keys 'class_name', 'docstring', 'methods', 'attributes', and 'base_classes'.
+    - tuple: A tuple where the first element is a list of 'ClassInfo' records, each representing a class in 
+             the analyzed file. The second element is a flattened list of imported modules. Each record holds 
+             the 'class_name', 'docstring', 'methods', 'attributes', and 'base_classes' of a class; use 
+             'to_dict' on it where the dictionary shape of older versions is needed.
 
     Note:
-    - This function relies on the 'ast' module for parsing and analyzing the Python file.
-    - Custom helper functions like 'flatten_list', 'format_docstring', and 'get_function_argument_types' 
-      are used to process and format the extracted data.
+    - This function relies on the 'ast' module for parsing the Python file, which is then traversed once by 
+      an 'AnalysisVisitor'.
+    - Custom helper functions like 'format_docstring' and 'get_function_argument_types' are used to process 
+      and format the extracted data.
     """
-    analysis_results = []
-    with open(file_path, 'r') as file:
-        tree = ast.parse(file.read())
-    
-    collector = ImportCollector()
-    collector.visit(tree)
-    imported_modules = collector.imports
-
-    classes = [node for node in ast.walk(tree) if isinstance(node, ast.ClassDef)]
-
-    root = ET.Element("diagram", program="umlet", version="15.1")
-    ET.SubElement(root, "zoom_level").text = "10"
-
-    for cls in classes:
-        class_info = {
-            'class_name': cls.name,
-            'docstring': format_docstring(ast.get_docstring(cls)) if ast.get_docstring(cls) else str(),
-            'methods': [],
-            'attributes': [],
-            'base_classes': [base.id for base in cls.bases if isinstance(base, ast.Name)]
-        }
+    with profile_stage("analyze"):
+        if source is None:
+            with open(file_path, 'r') as file:
+                source = file.read()
+        else:
+            # Decoded the way 'open' decodes text files, so both give the same analysis
+            source = io.TextIOWrapper(io.BytesIO(source)).read()
+
+        tree = None
+        if fast:
+            try:
+                tree = ast.parse(header_source(source))
+            except (HeaderScanError, SyntaxError):
+                # Fall back to parsing the whole file, which also reports real syntax errors properly
+                tree = None
+        if tree is None:
+            tree = ast.parse(source)
+
+        visitor = AnalysisVisitor()
+        visitor.visit(tree)
+        return visitor.classes, visitor.imports
+
+class _RelationTargets(dict):
+    """Maps the names used in one module to the 'display_name' of the class they resolve to, or None."""
+
+    def __init__(self, symbol_index, module):
+        super().__init__()
+        self.symbol_index = symbol_index
+        self.module = module
+
+    def __missing__(self, name):
+        qualified = self.symbol_index.resolve(name, self.module)
+        target = self[name] = self.symbol_index.display_name(qualified) if qualified is not None else None
+        return target
+
+def collect_relations(analysis_results, symbol_index):
+    """
+    Collects the relationships between the classes of a diagram.
 
-        for item in cls.body:
-            if isinstance(item, ast.FunctionDef):
-                if isinstance(item.returns, ast.Subscript):
-                    thisReturnType = get_type_annotation(item.returns)
-                else:
-                    thisReturnType = getattr(item.returns, 'id', None)
-                method_info = {
-                    'name': item.name,
-                    'return_type': thisReturnType if item.returns else None,
-                    'docstring': format_docstring(ast.get_docstring(item)) if ast.get_docstring(item) else str(),
-                    'input_types': get_function_argument_types(item)
-                }
-                class_info['methods'].append(method_info)
-
-            elif isinstance(item, ast.AnnAssign) or isinstance(item, ast.Assign):
-                attr_name = None
-                attr_type = None
-                if isinstance(item, ast.Assign):
-                    for target in item.targets:
-                        if isinstance(target, ast.Name):
-                            attr_name = target.id
-                            attr_type = getattr(item.value, 'id', None)
-                else:
-                    attr_name = item.target.id
-                    attr_type = get_type_annotation(item.annotation)
+    A relation is recorded for the first base class of every class, and for every method return type, method 
+    argument type and attribute type that names a known class. Names are resolved with 'SymbolIndex.resolve' 
+    in the module of the class using them, and relations are recorded between 'SymbolIndex.display_name' names.
 
-                attr_info = {'name': attr_name, 'type': attr_type or str()}
-                class_info['attributes'].append(attr_info)
+    Parameters:
+    - analysis_results (list): A list of 'ClassInfo' records as returned by 'analyze_python_file'.
+    - symbol_index (SymbolIndex): The index the relation targets are resolved against.
 
-        analysis_results.append(class_info)
+    Returns:
+    - list: A list of 'Relation' records, in class order.
+    """
+    # The same few type names come up over and over within a module, so each is resolved only once per module
+    targetsByModule = {}
+
+    relations = []
+    for iterClass in analysis_results:
+        module = symbol_index.module_of(iterClass)
+        targets = targetsByModule.get(module)
+        if targets is None:
+            targets = targetsByModule[module] = _RelationTargets(symbol_index, module)
+        source = symbol_index.display_name(symbol_index.qualified_name(iterClass))
+        if iterClass.base_classes:
+            baseClass = targets[iterClass.base_classes[0]]
+            if baseClass is not None:
+                relations.append(Relation(source, baseClass, "Inherits from"))
+        for iterMethod in iterClass.methods:
+            if isinstance(iterMethod.return_type,tuple):
+                flattenedReturntypes = flatten_list(iterMethod.return_type)
+                for iterReturnType in flattenedReturntypes:
+                    target = targets[iterReturnType]
+                    if target is not None:
+                        relations.append(Relation(source, target, f"Function <{iterMethod.name}()> Returns container {flattenedReturntypes[0]} of Type"))
+            else:
+                target = targets[iterMethod.return_type]
+                if target is not None:
+                    relations.append(Relation(source, target, f"Function <{iterMethod.name}()> Return Type"))
+            for iterInputArgName, iterInputType in iterMethod.input_types.items():
+                target = targets[iterInputType]
+                if target is not None:
+                    relations.append(Relation(source, target, f"Arg ({iterInputArgName}) of type"))
+        for iterAttribute in iterClass.attributes:
+            iterAttributeName = iterAttribute.name
+            iterAttributeType = iterAttribute.type
+            if isinstance(iterAttributeType, tuple):
+                target = targets[iterAttributeType[1]]
+                if target is not None:
+                    relations.append(Relation(source, target, f"Attribute <{iterAttributeName}> container of type"))
+            else:
+                target = targets[iterAttributeType]
+                if target is not None:
+                    relations.append(Relation(source, target, f"Attribute <{iterAttributeName}> of type"))
+
+    return relations
+
+# The labels written by 'collect_relations', with the group and form each is listed under in a merged label
+_RELATION_LABELS = (
+    (re.compile(r"Function <(.*?)\(\)> Return"), "returns", "{}()"),
+    (re.compile(r"Arg \((.*?)\) of type"), "args", "{}"),
+    (re.compile(r"Attribute <(.*?)> "), "attributes", "{}"),
+)
+# Merged labels start with the number of relations they stand for
+_AGGREGATED_LABEL = re.compile(r"\d+ relations\n")
+# Every label 'collect_relations' and 'aggregate_relations' write, to tell the tool's arrows from hand drawn ones
+_GENERATED_LABEL = re.compile(r"Inherits from|Function <.*?\(\)> Return(?: Type|s container .* of Type)"
+                              r"|Arg \(.*?\) of type|Attribute <.*?> (?:container )?of type|\d+ relations\n(?s:.*)")
+
+def _aggregated_label(relations, listed):
+    """The label of the arrow standing for several relations between the same two classes."""
+    groups = {}
+    for relation in relations:
+        for pattern, group, form in _RELATION_LABELS:
+            match = pattern.match(relation.relation_type)
+            if match:
+                name = form.format(match.group(1))
+                break
+        else:
+            group, name = "other", relation.relation_type
+        counts = groups.setdefault(group, {})
+        counts[name] = counts.get(name, 0) + 1
+
+    lines = [f"{len(relations)} relations"]
+    for group, counts in groups.items():
+        names = [name if count == 1 else f"{name} x{count}" for name, count in itertools.islice(counts.items(), listed)]
+        if len(counts) > listed:
+            names.append(f"+{len(counts) - listed} more")
+        lines.append(f"{group}: {', '.join(names)}")
+    return "\n".join(lines)
+
+def aggregate_relations(relations, listed=4):
+    """
+    Merges the relations between the same two classes into a single relation, so that a class using another 
+    one in many places is joined to it by one arrow instead of a bundle of overlapping ones.
 
-    return analysis_results,imported_modules
+    The relations from one class to another, other than inheritance, become one relation whose label gives 
+    their number and lists the methods, arguments and attributes behind them by group, e.g. 
+    "3 relations\nreturns: get(), find()\nargs: entity". Inheritance stays a relation of its own, as the 
+    layouts arrange classes by it. A class pair with a single relation keeps it unchanged.
 
-def create_xml_output(analysis_results, xmlPath, imported_modules=None):
+    Parameters:
+    - relations (list): 'Relation' records as returned by 'collect_relations'.
+    - listed (int, optional): The number of names listed per group. Further names are only counted. 
+                              Defaults to 4.
+
+    Returns:
+    - list: The merged 'Relation' records, in the order each class pair first appears in 'relations'.
+    """
+    pairs = {}
+    merged = []
+    for relation in relations:
+        if relation.relation_type == "Inherits from":
+            merged.append(relation)
+            continue
+        key = (relation.source, relation.target)
+        if key not in pairs:
+            pairs[key] = []
+            merged.append(key)
+        pairs[key].append(relation)
+
+    for index, item in enumerate(merged):
+        if isinstance(item, tuple):
+            group = pairs[item]
+            merged[index] = group[0] if len(group) == 1 else Relation(item[0], item[1], _aggregated_label(group, listed))
+    return merged
+
+# Distance between the corner of a Relation element and the start of its line
+ARROW_OFFSET = 20
+
+def compute_arrows(nodeCoords, relations, routing="straight"):
+    """
+    Computes the arrows drawn for a list of relations between positioned nodes.
+
+    Each arrow leaves its source node from the side closest to the target node and enters the target on the 
+    side closest to the source. Arrows sharing a side are spread along it.
+
+    Parameters:
+    - nodeCoords (dict): The positioned nodes, as returned by a layout engine.
+    - relations (list): The 'Relation' records to draw. Both ends must be in 'nodeCoords'.
+    - routing (str, optional): "straight" draws every arrow as one line. "orthogonal" draws it as horizontal 
+                               and vertical segments going around the other nodes (see 'OrthogonalRouter'). 
+                               Defaults to "straight".
+
+    Returns:
+    - list: One dictionary per relation with the start and end point of the arrow, its travel, its direction, 
+            the relation type, the connected nodes and the number of blank lines to shift its label by. 
+            Orthogonal arrows also hold the absolute (x, y) points of their line under 'points'.
+
+    Raises:
+    - ValueError: If 'routing' is not one of 'ROUTING_STYLES'.
+    """
+    # Side selection and anchor placement run over all relations at once on numeric copies of the coordinates
+    rects = NodeRects(nodeCoords)
+    sources = [rects.index[relation.source] for relation in relations]
+    targets = [rects.index[relation.target] for relation in relations]
+    sides1, sides2 = closest_side_pairs(rects, sources, targets)
+    start_points, end_points, connectionNumbers1, connectionNumbers2 = connection_anchors(rects, sources, targets, sides1, sides2)
+    if routing not in ROUTING_STYLES:
+        raise ValueError(f"Unsupported routing: {routing}")
+    router = None
+    if routing == "orthogonal" and relations:
+        router = OrthogonalRouter([(int(node['x']), int(node['y']), int(node['w']), int(node['h'])) for node in nodeCoords.values()])
+
+    # List to store arrow data
+    arrows = []
+    offset = ARROW_OFFSET
+    for i, (sourceNode, destinNode, relationType) in enumerate(relations):
+        start_point, end_point = start_points[i], end_points[i]
+        connectionNumber1, connectionNumber2 = connectionNumbers1[i], connectionNumbers2[i]
+
+        # Determine the direction of the arrow based on the sides
+        direction = ""
+        side1 = SIDES[sides1[i]]
+        if side1 == "north":
+            direction = "up"
+        elif side1 == "south":
+            direction = "down"
+        elif side1 == "east":
+            direction = "right"
+        else:  # side1 == "west"
+            direction = "left"
+
+        start_x = start_point[0] - offset
+        end_x = end_point[0]
+        x_travel = int(end_x - start_x)
+        start_y = start_point[1] - offset
+        end_y = end_point[1]
+        y_travel = int(end_y - start_y)
+        # Append the arrow data to the list
+        arrow = {
+            'start_x': start_x,
+            'start_y': start_y,
+            'end_x': end_x,
+            'end_y': end_y,
+            'travel_x':x_travel,
+            'travel_y':y_travel,
+            'direction': direction,
+            'relation_type': relationType,
+            'connecting':(sourceNode,destinNode),
+            'lineOffset': 0 if connectionNumber1!=connectionNumber2 or connectionNumber1==1 else connectionNumber1*2
+        }
+        if router is not None:
+            # Routed arrows no longer overlap, so their labels need no shifting
+            arrow['points'] = router.route(start_point, sides1[i], end_point, sides2[i])
+            arrow['lineOffset'] = 0
+        arrows.append(arrow)
+
+    return arrows
+
+def create_xml_output(analysis_results, xmlPath, imported_modules=None, symbol_index=None, layout="polygon", layout_options=None, update=False, relations=None, routing="straight", verbose_relations=False, selection=None):
     """
     Generates an XML output representing UML class diagrams from the analysis results of Python code.
 
@@ -535,10 +1220,27 @@ def create_xml_output(analysis_results, xmlPath, imported_modules=None):
     start and end points, as well as the direction of the arrow.
 
     Parameters:
-    - analysis_results (list): A list of dictionaries, each containing details about a class extracted 
-                               from static analysis of Python code.
+    - analysis_results (list): A list of 'ClassInfo' records (or class dictionaries in the older format), 
+                               each containing details about a class extracted from static analysis of Python code.
     - xmlPath (str): The file path where the generated XML content will be saved.
     - imported_modules (list, optional): A list of module names that were imported in the analyzed code.
+    - symbol_index (SymbolIndex, optional): A prebuilt index of 'analysis_results' and 'imported_modules'. 
+                                            Built on the fly when not given.
+    - layout (str, optional): The name of the layout engine in 'LAYOUT_ENGINES' used to position the classes. 
+                              Defaults to "polygon".
+    - layout_options (dict, optional): Extra keyword arguments for the layout engine, such as 'seed' or 
+                                       'time_budget' for the "force" engine.
+    - update (bool, optional): When 'xmlPath' already holds a diagram, update it with 'update_xml_output' 
+                               instead of laying it out again, which keeps its existing layout. Defaults to False.
+    - relations (list, optional): The 'Relation' records of the diagram, when they were already collected for a 
+                                  larger diagram. The classes are then drawn under their own 'class_name', and 
+                                  'imported_modules' and 'symbol_index' are not used.
+    - routing (str, optional): How arrows are drawn, "straight" or "orthogonal" (see 'compute_arrows'). 
+                               Defaults to "straight".
+    - verbose_relations (bool, optional): Draw one arrow per relation. By default the relations between two 
+                                          classes are merged into one arrow with 'aggregate_relations'.
+    - selection (dict, optional): Keyword arguments for 'select_classes', such as 'focus' and 'depth'. Only the 
+                                  selected classes are laid out and written.
 
     Returns:
     - bool: True if the XML file is successfully written, False if an exception occurs during file writing.
@@ -547,228 +1249,1037 @@ def create_xml_output(analysis_results, xmlPath, imported_modules=None):
     - Exception: If an unrecognized arrow type is encountered during the processing of relationship data.
 
     Note:
-    - This function relies on external functions like 'flatten_list', 'length_of_longest_element', 
-      'arrange_boxes', 'closest_sides', 'calculate_midpoint', and 'format_class_details' for processing 
-      the analysis results and generating the XML content.
+    - This function relies on external functions like 'SymbolIndex', 'collect_relations', 'class_boxes', 
+      'aggregate_relations', 'LAYOUT_ENGINES', 'compute_arrows' and 'write_class_diagram' for processing the analysis results and 
+      generating the XML content.
     """
-    classNames = []
+    # Callers may still pass the dictionaries produced by older versions
+    analysis_results = as_class_infos(analysis_results)
+    with profile_stage("relations"):
+        if relations is None:
+            if symbol_index is None:
+                symbol_index = SymbolIndex(analysis_results, imported_modules)
+            relations = collect_relations(analysis_results, symbol_index)
+            # Classes sharing their name with classes of other modules are drawn under their qualified name
+            analysis_results = symbol_index.diagram_classes(analysis_results)
+        if selection:
+            selected = set(select_classes([class_info.class_name for class_info in analysis_results], relations, **selection))
+            analysis_results = [class_info for class_info in analysis_results if class_info.class_name in selected]
+            relations = [relation for relation in relations if relation.source in selected]
+        if not verbose_relations:
+            relations = aggregate_relations(relations)
+
+    if update and os.path.isfile(xmlPath):
+        try:
+            previous = read_uxf(xmlPath)
+        except (OSError, ValueError) as e:
+            print(f"Could not read <{xmlPath}>, writing it from scratch: {e}")
+        else:
+            return update_xml_output(analysis_results, xmlPath, previous, relations, layout, layout_options, routing)
 
-    for iterClass in analysis_results:
-        classNames.append(iterClass.get("class_name"))
+    #   Decide the coords of each node here
+    #   nodeCoords should be in format: {classname: NodeBox(x, y, w, h)}
 
-    relations = []
-    for iterClass in analysis_results:
-        if iterClass["base_classes"]:
-            relations.append((iterClass["class_name"], iterClass["base_classes"][0], "Inherits from"))
-        for iterMethod in iterClass["methods"]:
-            if isinstance(iterMethod["return_type"],tuple):
-                flattenedReturntypes = flatten_list(iterMethod["return_type"])
-                for iterReturnType in flattenedReturntypes:
-                    if iterReturnType in classNames:
-                        relations.append((iterClass["class_name"], iterReturnType, f"Function <{iterMethod['name']}()> Returns container {flattenedReturntypes[0]} of Type"))
-            elif iterMethod["return_type"] in classNames:
-                relations.append((iterClass["class_name"], iterMethod["return_type"], f"Function <{iterMethod['name']}()> Return Type"))
-            for iterInputArgName, iterInputType in iterMethod["input_types"].items():
-                if iterInputType in classNames:
-                    relations.append((iterClass["class_name"], iterInputType, f"Arg ({iterInputArgName}) of type"))
-        for iterAttribute in iterClass["attributes"]:
-            iterAttributeName = iterAttribute["name"]
-            iterAttributeType = iterAttribute["type"]
-            if isinstance(iterAttributeType, tuple):
-                relations.append((iterClass["class_name"], iterAttributeType[1], f"Attribute <{iterAttributeName}> container of type"))
-            elif iterAttributeType in classNames:
-                relations.append((iterClass["class_name"], iterAttributeType, f"Attribute <{iterAttributeName}> of type"))
+    with profile_stage("boxes"):
+        nodeCoords = class_boxes(analysis_results)
+    with profile_stage("layout"):
+        nodeCoords = LAYOUT_ENGINES[layout](nodeCoords, relations, **(layout_options or {}))
 
-    #   Decide the coords of each node here
-    #   nodeCoords should be in format: {classname: {"x":x_coord, "y":y_coord, "w":width, "h":height}}
+    with profile_stage("arrows"):
+        # Relations to classes that are not part of this diagram are not drawn
+        drawnRelations = [relation for relation in relations if relation.target in nodeCoords]
+
+        arrows = compute_arrows(nodeCoords, drawnRelations, routing)
+    with profile_stage("xml"):
+        return write_class_diagram(xmlPath, analysis_results, nodeCoords, arrows)
+
+
+def _panel_class_name(panel_attributes):
+    """The class name in the panel text of a class box written by this tool, or None for other boxes."""
+    lines = panel_attributes.split("\n")
+    if "<<Class>>" in lines:
+        index = lines.index("<<Class>>")
+        if index + 1 < len(lines):
+            return lines[index + 1]
+    return None
+
+
+def update_xml_output(analysis_results, xmlPath, previous, relations, layout="polygon", layout_options=None, routing="straight"):
+    """
+    Updates an existing diagram to new analysis results, keeping its layout.
+
+    Class boxes are matched to classes by name. A class whose box text is unchanged keeps its element exactly 
+    as it was, including any position or size set by hand in UMLet. A changed class keeps its position and is 
+    resized to its new content. Only new classes are laid out, with the 'layout' engine, below the existing 
+    diagram. Arrows between two unchanged classes are kept as they are, arrows touching a changed or new class 
+    are placed again, and arrows of relations that no longer exist are removed along with the boxes of removed 
+    classes. An arrow counts as one the tool drew when it joins two class boxes and its label is one the tool 
+    writes. All other elements, such as notes or relations drawn by hand, are copied through untouched.
+
+    Parameters:
+    - analysis_results (list): 'ClassInfo' records of the classes of the diagram.
+    - xmlPath (str): The path of the diagram, which is rewritten in place.
+    - previous (tuple): The zoom level and elements of the existing diagram, as returned by 'read_uxf'.
+    - relations (list): The 'Relation' records of the classes, as returned by 'collect_relations' or 
+                        'aggregate_relations'.
+    - layout (str, optional): The name of the layout engine in 'LAYOUT_ENGINES' used to place new classes.
+    - layout_options (dict, optional): Extra keyword arguments for the layout engine.
+    - routing (str, optional): How the arrows placed again are drawn, "straight" or "orthogonal".
 
+    Returns:
+    - bool: True if the XML file is successfully written, False if an exception occurs during file writing.
+    """
+    zoom_level, elements = previous
+    oldBoxes = {}
+    for element in elements:
+        if element.element_id == "UMLClass":
+            name = _panel_class_name(element.panel_attributes)
+            if name is not None:
+                oldBoxes.setdefault(name, element)
+
+    with profile_stage("boxes"):
+        nodeCoords = {}
+        unchanged = set()
+        newBoxes = {}
+        for class_info in analysis_results:
+            name = class_info.class_name
+            box = render_class_box(class_info)
+            old = oldBoxes.get(name)
+            if old is None:
+                newBoxes[name] = NodeBox(w=box.w, h=box.h)
+            elif old.panel_attributes == box.panel_attributes:
+                nodeCoords[name] = NodeBox(old.x, old.y, old.w, old.h)
+                unchanged.add(name)
+            else:
+                nodeCoords[name] = NodeBox(old.x, old.y, box.w, box.h)
+
+    if newBoxes:
+        with profile_stage("layout"):
+            newRelations = [relation for relation in relations if relation.source in newBoxes and relation.target in newBoxes]
+            placed = LAYOUT_ENGINES[layout](newBoxes, newRelations, **(layout_options or {}))
+            # New classes go below everything already in the diagram, so that nothing existing moves
+            blocks = [element for element in elements if element.element_id != "Relation"]
+            left = min((element.x for element in blocks), default=50)
+            top = max((element.y + element.h for element in blocks), default=-50) + 80
+            minX = min(int(box['x']) for box in placed.values())
+            minY = min(int(box['y']) for box in placed.values())
+            for name, box in placed.items():
+                nodeCoords[name] = NodeBox(int(box['x']) - minX + left, int(box['y']) - minY + top, box['w'], box['h'])
+
+    with profile_stage("arrows"):
+        # Attribute the existing arrows to the classes their ends touch
+        verticalSides, horizontalSides = {}, {}
+        for name, element in oldBoxes.items():
+            for x in (element.x, element.x + element.w):
+                verticalSides.setdefault(x, []).append((element.y, element.y + element.h, name))
+            for y in (element.y, element.y + element.h):
+                horizontalSides.setdefault(y, []).append((element.x, element.x + element.w, name))
+
+        def class_at(point):
+            x, y = round(point[0]), round(point[1])
+            for along, across, sides in ((x, y, verticalSides), (y, x, horizontalSides)):
+                for key in (along, along - 1, along + 1):
+                    for low, high, name in sides.get(key, ()):
+                        if low <= across <= high:
+                            return name
+            return None
+
+        oldArrows = {}
+        attributed = set()
+        for index, element in enumerate(elements):
+            points = element.points() if element.element_id == "Relation" else []
+            if len(points) < 2:
+                continue
+            source, target = class_at(points[0]), class_at(points[-1])
+            if source is None or target is None:
+                continue
+            # The label is what remains of the panel text without the line type, the end labels and the blank 
+            # lines shifting it
+            label = "\n".join(line for line in element.panel_attributes.split("\n")
+                              if line and not line.startswith(("lt=", "m1=", "m2=")))
+            if _GENERATED_LABEL.fullmatch(label):
+                oldArrows.setdefault((source, target, label), []).append(element)
+                attributed.add(index)
+
+        drawnRelations = [relation for relation in relations if relation.target in nodeCoords]
+        kept = {}
+        rerouted = []
+        for index, relation in enumerate(drawnRelations):
+            candidates = oldArrows.get((relation.source, relation.target, relation.relation_type))
+            if candidates and relation.source in unchanged and relation.target in unchanged:
+                kept[index] = candidates.pop(0)
+            else:
+                rerouted.append(relation)
+        arrows = iter(compute_arrows(nodeCoords, rerouted, routing))
+
+    with profile_stage("xml"):
+        try:
+            with UXFWriter(xmlPath, zoom_level=zoom_level) as writer:
+                for class_info in analysis_results:
+                    name = class_info.class_name
+                    if name in unchanged:
+                        writer.copy_element(oldBoxes[name])
+                    else:
+                        nodeInfo = nodeCoords[name]
+                        writer.write_element("UMLClass", nodeInfo['x'], nodeInfo['y'], nodeInfo['w'], nodeInfo['h'],
+                                             render_class_box(class_info).panel_attributes)
+                for index in range(len(drawnRelations)):
+                    if index in kept:
+                        writer.copy_element(kept[index])
+                    else:
+                        write_arrow(writer, next(arrows))
+                # Everything the tool did not generate itself is kept as it is
+                for index, element in enumerate(elements):
+                    if index in attributed:
+                        continue
+                    if element.element_id == "UMLClass" and _panel_class_name(element.panel_attributes) is not None:
+                        continue
+                    writer.copy_element(element)
+            return True
+        except OSError:
+            return False
+
+
+def class_boxes(analysis_results):
+    """
+    Renders the box of every class and lines the boxes up in a row, as the starting point of a layout.
+
+    Parameters:
+    - analysis_results (list): 'ClassInfo' records.
+
+    Returns:
+    - dict: Maps each class name to its 'NodeBox'.
+    """
     nodeCoords = {}
-    starting_x = "50"
+    starting_x = 50
     for iterClass in analysis_results:
-        longest_element_length = length_of_longest_element(iterClass)
-        scale_factor = 10  # Adjust this factor as needed
-        width = max(210, longest_element_length * scale_factor)
-        thisNodeCoords = {
-            "x":starting_x,
-            "y":"30",
-            "w":str(width),
-            "h":"260"       
-            }
-        nodeCoords[iterClass["class_name"]] = thisNodeCoords
-        starting_x = str( int(starting_x)+width+50)
-
-    shape = len(analysis_results)
-    nodeCoords = arrange_boxes(nodeCoords, shape)
-       
+        box = render_class_box(iterClass)
+        nodeCoords[iterClass.class_name] = NodeBox(x=starting_x, y=30, w=box.w, h=box.h)
+        starting_x += box.w + 50
+    return nodeCoords
 
-    # List to store arrow data
-    arrows = []
-    # Initialize connection counts for each side of each node
-    for node_name, node_data in nodeCoords.items():
-        node_data['connectionCounts'] = {'north': 0, 'south': 0, 'east': 0, 'west': 0}
 
-    # Function to increment connection count and get the connection number
-    def get_connection_number(node, side):
-        node['connectionCounts'][side] += 1
-        return node['connectionCounts'][side]
+def write_class_diagram(xmlPath, analysis_results, nodeCoords, arrows):
+    """
+    Writes the classes and arrows of a laid out diagram to a .uxf file.
 
+    Parameters:
+    - xmlPath (str): The file path where the diagram will be saved.
+    - analysis_results (list): 'ClassInfo' records, in the order their boxes are written.
+    - nodeCoords (dict): Maps each class name to its positioned 'NodeBox'.
+    - arrows (list): The arrows returned by 'compute_arrows'.
 
-    # Loop through each relation
-    for relation in relations:
-        sourceNode = relation[0]
-        destinNode = relation[1]
-        relationType = relation[2]
+    Returns:
+    - bool: True if the XML file is successfully written, False if an exception occurs during file writing.
 
-        # Get the nodes from the nodes dictionary
-        if destinNode in flatten_list(imported_modules):
-            pass
-        else:
-            node1 = nodeCoords[sourceNode]
-            node2 = nodeCoords[destinNode]
-
-            # Find the closest sides
-            side1, side2 = closest_sides(node1, node2)
-
-            # Increment connection counts and get connection numbers
-            connectionNumber1 = get_connection_number(node1, side1)
-            totalConnections1 = node1['connectionCounts'][side1]
-            connectionNumber2 = get_connection_number(node2, side2)
-            totalConnections2 = node2['connectionCounts'][side2]
-
-            start_point = calculate_midpoint(node1, side1, connectionNumber1, totalConnections1)
-            end_point = calculate_midpoint(node2, side2, connectionNumber2, totalConnections2)
-
-
-            # Determine the direction of the arrow based on the sides
-            direction = ""
-            if side1 == "north":
-                direction = "up"
-            elif side1 == "south":
-                direction = "down"
-            elif side1 == "east":
-                direction = "right"
-            else:  # side1 == "west"
-                direction = "left"
-
-            offset = 20
-            start_x = start_point[0] - offset
-            end_x = end_point[0]
-            x_travel = int(end_x - start_x)
-            start_y = start_point[1] - offset
-            end_y = end_point[1]
-            y_travel = int(end_y - start_y)
-            # Append the arrow data to the list
-            arrow = {
-                'start_x': start_x,
-                'start_y': start_y,
-                'end_x': end_x,
-                'end_y': end_y,
-                'travel_x':x_travel,
-                'travel_y':y_travel,
-                'direction': direction,
-                'relation_type': relationType,
-                'connecting':(sourceNode,destinNode),
-                'lineOffset': 0 if connectionNumber1!=connectionNumber2 or connectionNumber1==1 else connectionNumber1*2
-            }
-            arrows.append(arrow)
-
-    root = ET.Element("diagram", program="umlet", version="15.1")
-    ET.SubElement(root, "zoom_level").text = "10"
-
-
-    starting_x = "50"
-    for class_info in analysis_results:
-        class_name = class_info["class_name"]
-        nodeInfo = nodeCoords.get(class_name)
-        element = ET.SubElement(root, "element")
-        ET.SubElement(element, "id").text = "UMLClass"
-        coordinates = ET.SubElement(element, "coordinates")
-        ET.SubElement(coordinates, "x").text = str(nodeInfo['x'])
-        ET.SubElement(coordinates, "y").text = str(nodeInfo['y'])
-        ET.SubElement(coordinates, "w").text = str(nodeInfo['w'])
-        ET.SubElement(coordinates, "h").text = str(nodeInfo['h'])
-
-        ET.SubElement(element, "panel_attributes").text = format_class_details(class_info)
-        ET.SubElement(element, "additional_attributes")
-
-    for arrow in arrows:
-        element = ET.SubElement(root, "element")
-        ET.SubElement(element, "id").text = "Relation"
-        coordinates = ET.SubElement(element, "coordinates")
-        ET.SubElement(coordinates, "x").text = str(arrow['start_x'])
-        ET.SubElement(coordinates, "y").text = str(arrow['start_y'])
-        ET.SubElement(coordinates, "w").text = str(arrow['travel_x'])
-        ET.SubElement(coordinates, "h").text = str(arrow['travel_y'])
-
-        panelText = ""
-        # Set arrow direction
-        # WORKING :)
-        if arrow["direction"] == "left":
-            panelText += "lt=<-\n"
-        else:
-            panelText += "lt=->\n"
-
-        # Set arrow maintext based on relationship
-        if arrow["lineOffset"]:
-            for newlineIteration in range(arrow["lineOffset"]):
-                panelText += "\n"
-        if "inherits" in arrow["relation_type"].lower():
-            panelText += arrow["relation_type"]
-        elif "of type" in arrow["relation_type"].lower():
-            panelText += arrow["relation_type"]
-        elif "contain" in arrow["relation_type"].lower():
-            panelText +=  f"m1=contains\nm2=0...n\n{arrow['relation_type']}"
-        elif "return type" in arrow["relation_type"].lower():
-            panelText += arrow["relation_type"]
-        else:
-            raise Exception(f"Non-recognized arrow: {str(arrow)}")
-        ET.SubElement(element, "panel_attributes").text = panelText
-        ET.SubElement(element, "additional_attributes").text = f"{str(offset)}.0;{str(offset)}.0;{str(arrow['travel_x'])}.0;{str(arrow['travel_y'])}.0"
+    Raises:
+    - Exception: If an unrecognized arrow type is encountered.
+    """
+    # Stream the elements straight into the file rather than building the whole diagram in memory first
+    try:
+        with UXFWriter(xmlPath) as writer:
+            for class_info in analysis_results:
+                class_name = class_info.class_name
+                nodeInfo = nodeCoords.get(class_name)
+                writer.write_element("UMLClass", nodeInfo['x'], nodeInfo['y'], nodeInfo['w'], nodeInfo['h'],
+                                     render_class_box(class_info).panel_attributes)
+
+            for arrow in arrows:
+                write_arrow(writer, arrow)
+        return True
+    except OSError:
+        return False
 
 
-    # Pretty print and write to XML file
-    xml_str = minidom.parseString(ET.tostring(root)).toprettyxml(indent="    ")
+def write_arrow(writer, arrow):
+    """
+    Writes the relation element of one arrow.
+
+    Parameters:
+    - writer (UXFWriter): The writer of the diagram.
+    - arrow (dict): An arrow returned by 'compute_arrows'.
+
+    Raises:
+    - Exception: If the arrow's relation type is not recognized.
+    """
+    panelText = ""
+    # Set arrow direction
+    # WORKING :)
+    if arrow["direction"] == "left":
+        panelText += "lt=<-\n"
+    else:
+        panelText += "lt=->\n"
+
+    # Set arrow maintext based on relationship
+    if arrow["lineOffset"]:
+        for newlineIteration in range(arrow["lineOffset"]):
+            panelText += "\n"
+    if _AGGREGATED_LABEL.match(arrow["relation_type"]):
+        panelText += arrow["relation_type"]
+    elif "inherits" in arrow["relation_type"].lower():
+        panelText += arrow["relation_type"]
+    elif "of type" in arrow["relation_type"].lower():
+        panelText += arrow["relation_type"]
+    elif "contain" in arrow["relation_type"].lower():
+        panelText +=  f"m1=contains\nm2=0...n\n{arrow['relation_type']}"
+    elif "return type" in arrow["relation_type"].lower():
+        panelText += arrow["relation_type"]
+    else:
+        raise Exception(f"Non-recognized arrow: {str(arrow)}")
+    x, y, w, h, points = relation_geometry(arrow)
+    writer.write_element("Relation", x, y, w, h, panelText, points)
+
+
+def relation_geometry(arrow):
+    """
+    The coordinates of the Relation element drawing an arrow.
+
+    Parameters:
+    - arrow (dict): An arrow returned by 'compute_arrows'.
+
+    Returns:
+    - tuple: The x, y, w and h of the element, and its additional attributes listing the points of the line.
+    """
+    if not arrow.get("points"):
+        return (arrow['start_x'], arrow['start_y'], arrow['travel_x'], arrow['travel_y'],
+                f"{str(ARROW_OFFSET)}.0;{str(ARROW_OFFSET)}.0;{str(arrow['travel_x'])}.0;{str(arrow['travel_y'])}.0")
+    # A routed element spans the bounding box of its line, and its points are relative to the element's corner
+    points = arrow["points"]
+    left = min(x for x, _ in points) - ARROW_OFFSET
+    top = min(y for _, y in points) - ARROW_OFFSET
+    width = max(x for x, _ in points) - left + ARROW_OFFSET
+    height = max(y for _, y in points) - top + ARROW_OFFSET
+    return left, top, width, height, ";".join(f"{x - left}.0;{y - top}.0" for x, y in points)
+
+
+def create_index_output(partitions, partitionFiles, crossRelations, xmlPath, layout="polygon", layout_options=None, routing="straight"):
+    """
+    Writes an overview diagram with one box per partition of a partitioned diagram.
+
+    Each box names the partition, its number of classes and the .uxf file holding it. An arrow is drawn from one 
+    partition to another when classes of the first refer to classes of the second, labelled with the number of 
+    such relations.
+
+    Parameters:
+    - partitions (dict): Maps each partition name to the list of its class names.
+    - partitionFiles (dict): Maps each partition name to the path of its diagram, relative to 'xmlPath'.
+    - crossRelations (dict): Maps (source partition, target partition) pairs to their number of relations.
+    - xmlPath (str): The file path where the overview diagram will be saved.
+    - layout (str, optional): The name of the layout engine in 'LAYOUT_ENGINES'. Defaults to "polygon".
+    - layout_options (dict, optional): Extra keyword arguments for the layout engine.
+    - routing (str, optional): How arrows are drawn, "straight" or "orthogonal". Defaults to "straight".
+
+    Returns:
+    - bool: True if the XML file is successfully written, False if an exception occurs during file writing.
+    """
+    panels = {}
+    nodeCoords = {}
+    for name, classNames in partitions.items():
+        panels[name] = f"<<Package>>\n{name}\n--\n{len(classNames)} classes\nSee: {partitionFiles[name]}\n"
+        longest = max(len(line) for line in panels[name].split("\n"))
+        nodeCoords[name] = {"x": "0", "y": "0", "w": str(max(210, longest * 10)), "h": "120"}
+
+    relations = [Relation(source, target, f"{count} relation(s)") for (source, target), count in crossRelations.items()]
+    nodeCoords = LAYOUT_ENGINES[layout](nodeCoords, relations, **(layout_options or {}))
+    arrows = compute_arrows(nodeCoords, relations, routing)
+
     try:
-        with open(xmlPath, "w") as f:
-            f.write(xml_str)
+        with UXFWriter(xmlPath) as writer:
+            for name, panelText in panels.items():
+                nodeInfo = nodeCoords[name]
+                writer.write_element("UMLClass", nodeInfo['x'], nodeInfo['y'], nodeInfo['w'], nodeInfo['h'], panelText)
+            for arrow in arrows:
+                panelText = f"lt=<-\n{arrow['relation_type']}" if arrow["direction"] == "left" else f"lt=->\n{arrow['relation_type']}"
+                x, y, w, h, points = relation_geometry(arrow)
+                writer.write_element("Relation", x, y, w, h, panelText, points)
         return True
-    except Exception:
+    except OSError:
         return False
 
+def _render_partition(task):
+    """Renders one partition of 'create_partitioned_output'; module level so it can run in a worker process."""
+    analysis_results, xmlPath, relations, render_options = task
+    return create_xml_output(analysis_results, xmlPath, relations=relations, **(render_options or {}))
 
-if __name__ == "__main__":
+def partitions_directory(xmlPath):
+    """The directory 'create_partitioned_output' writes the partition diagrams of the overview 'xmlPath' to."""
+    return os.path.splitext(xmlPath)[0] + "_parts"
+
+def create_partitioned_output(inputFilePaths, results, xmlPath, partition="package", jobs=1, render_options=None, modules=None, changed=None):
+    """
+    Writes a multi-file diagram as several smaller diagrams, one per partition, plus an overview diagram.
+
+    The classes of all files are grouped by module, by package or by connected component of the relation graph 
+    (see 'partition_classes'). Each partition is laid out and written on its own, in parallel when 'jobs' 
+    allows, to a directory named after 'xmlPath' with a "_parts" suffix. A class referred to from another 
+    partition appears there as an empty stub box pointing at the diagram that defines it. 'xmlPath' itself 
+    receives the overview written by 'create_index_output'. Diagrams left in the directory by earlier runs for 
+    partitions that no longer exist are removed.
+
+    Classes sharing their name with classes of other modules are named by their qualified name, as in the 
+    single diagram. When a class is defined more than once in the same module, the first definition is used.
+
+    Parameters:
+    - inputFilePaths (list): The paths of the analysed Python files.
+    - results (list): The (analysis_results, imported_modules, xmlPath) tuple of each file, in the same order as 
+                      'inputFilePaths'.
+    - xmlPath (str): The file path of the overview diagram.
+    - partition (str, optional): The partition mode, one of 'PARTITION_MODES'. Defaults to "package".
+    - jobs (int, optional): The number of worker processes used to render partitions (0 = one per CPU).
+    - render_options (dict, optional): Extra keyword arguments for 'create_xml_output', such as 'layout'.
+    - modules (list, optional): The name each file is imported by, in the same order as 'inputFilePaths', when 
+                                it was recorded while analysing the files. See 'SymbolIndex.add'.
+    - changed (list, optional): The paths of the files changed since the diagrams were last written with the 
+                                same options, when none of them added, removed or renamed a class. Only the 
+                                partitions holding classes of these modules, or of the modules importing them 
+                                directly or indirectly (see 'SymbolIndex.dependents_of'), are drawn again, and 
+                                the others keep their diagram. Ignored for "component" partitions and selections, 
+                                whose partitions can change with any relation.
+
+    Returns:
+    - bool: True if every diagram was written successfully.
+    """
+    symbolIndex = SymbolIndex()
+    fileModules = {}
+    for iterFilePath, (thisAnalysis, thisImportedModules, _), module in zip(inputFilePaths, results, modules or itertools.repeat(None)):
+        fileModules[iterFilePath] = module if module is not None else import_name(iterFilePath)
+        symbolIndex.add(thisAnalysis, thisImportedModules, iterFilePath, fileModules[iterFilePath])
+
+    classInfos = {}
+    classModules = {}
+    importModules = {}
+    definitions = []
+    for iterFilePath, (thisAnalysis, _, _) in zip(inputFilePaths, results):
+        module = module_name(iterFilePath)
+        for iterClass, namedClass in zip(thisAnalysis, symbolIndex.diagram_classes(thisAnalysis)):
+            if namedClass.class_name not in classInfos:
+                classInfos[namedClass.class_name] = namedClass
+                classModules[namedClass.class_name] = module
+                importModules[namedClass.class_name] = fileModules[iterFilePath]
+                definitions.append(iterClass)
+
+    # Relations are resolved once for the whole project; the partitions are drawn from their share of them
+    relations = collect_relations(definitions, symbolIndex)
+    render_options = dict(render_options or {})
+    selection = render_options.pop("selection", None)
+    if selection:
+        # The partitions are cut from the selected classes only, instead of selecting within each of them
+        selected = select_classes(list(classInfos), relations, **selection)
+        classModules = {name: classModules[name] for name in selected}
+        relations = [relation for relation in relations if relation.source in classModules]
+    partitions = partition_classes(classModules, relations, partition)
+    partitionOf = {name: partitionName for partitionName, classNames in partitions.items() for name in classNames}
+    redrawn = None
+    if changed is not None and partition != "component" and not selection:
+        # Class names are unchanged, so a change can only reach the classes of its module and the relations of 
+        # the modules resolving names through it
+        affected = set()
+        for iterFilePath in changed:
+            affected.add(fileModules[iterFilePath])
+            affected.update(symbolIndex.dependents_of(fileModules[iterFilePath]))
+        redrawn = {partitionOf[name] for name, module in importModules.items() if module in affected and name in partitionOf}
+
+    partsDir = partitions_directory(xmlPath)
+    os.makedirs(partsDir, exist_ok=True)
+    partitionPaths = {name: os.path.join(partsDir, safe_file_name(name) + ".uxf") for name in partitions}
+    partitionFiles = {name: os.path.relpath(path, os.path.dirname(xmlPath) or os.curdir) for name, path in partitionPaths.items()}
+    # Diagrams of partitions that no longer exist, e.g. after a module was renamed, would linger next to the new ones
+    for fileName in os.listdir(partsDir):
+        stalePath = os.path.join(partsDir, fileName)
+        if fileName.endswith(".uxf") and stalePath not in partitionPaths.values() and os.path.isfile(stalePath):
+            os.remove(stalePath)
+
+    # Relations leaving a partition point at stub boxes standing in for the class in the other partition
+    stubs = {name: {} for name in partitions}
+    crossRelations = {}
+    partitionRelations = {name: [] for name in partitions}
+    for relation in relations:
+        source, target = relation.source, relation.target
+        partitionRelations[partitionOf[source]].append(relation)
+        if target not in partitionOf:
+            continue
+        sourcePartition, targetPartition = partitionOf[source], partitionOf[target]
+        if sourcePartition != targetPartition:
+            crossRelations[(sourcePartition, targetPartition)] = crossRelations.get((sourcePartition, targetPartition), 0) + 1
+            if target not in stubs[sourcePartition]:
+                stubs[sourcePartition][target] = ClassInfo(
+                    class_name=target,
+                    docstring=f"Defined in {os.path.basename(partitionPaths[targetPartition])}"
+                )
+
+    tasks = [([classInfos[name] for name in classNames] + list(stubs[partitionName].values()),
+              partitionPaths[partitionName], partitionRelations[partitionName], render_options)
+             for partitionName, classNames in partitions.items()
+             if redrawn is None or partitionName in redrawn or not os.path.isfile(partitionPaths[partitionName])]
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+            written = list(executor.map(_render_partition, tasks))
+    else:
+        written = [_render_partition(task) for task in tasks]
+
+    indexWritten = create_index_output(partitions, partitionFiles, crossRelations, xmlPath,
+                                       render_options.get("layout", "polygon"), render_options.get("layout_options"),
+                                       render_options.get("routing", "straight"))
+    return all(written) and indexWritten
+
+def write_merged_output(inputFilePaths, results, xmlPath="diagram.uxf", symbol_index=None, partition=None, jobs=1, render_options=None, modules=None):
+    """
+    Writes the diagram combining every analysed file, either as one diagram or partitioned.
+
+    Parameters:
+    - inputFilePaths (list): The paths of the analysed Python files.
+    - results (list): The (analysis_results, imported_modules, xmlPath) tuple of each file, in the same order as 
+                      'inputFilePaths'.
+    - xmlPath (str, optional): The path of the merged (or overview) diagram. Defaults to "diagram.uxf".
+    - symbol_index (SymbolIndex, optional): A prebuilt index of all results, added with their file paths, reused 
+                                            for the single diagram.
+    - partition (str, optional): When set, the partition mode passed to 'create_partitioned_output'.
+    - jobs (int, optional): The number of worker processes used to render partitions.
+    - render_options (dict, optional): Extra keyword arguments for 'create_xml_output', such as 'layout'.
+    - modules (list, optional): The name each file is imported by, in the same order as 'inputFilePaths', when 
+                                it was recorded while analysing the files. See 'SymbolIndex.add'.
+
+    Returns:
+    - bool: True if the diagram(s) were written successfully.
+    """
+    if partition:
+        return create_partitioned_output(inputFilePaths, results, xmlPath, partition, jobs, render_options, modules)
+    analysis = []
+    buildIndex = symbol_index is None
+    if buildIndex:
+        symbol_index = SymbolIndex()
+    for iterFilePath, (thisAnalysis, thisImportedModules, _), module in zip(inputFilePaths, results, modules or itertools.repeat(None)):
+        analysis.extend(thisAnalysis)
+        if buildIndex:
+            symbol_index.add(thisAnalysis, thisImportedModules, iterFilePath, module)
+    return create_xml_output(analysis, xmlPath, symbol_index=symbol_index, **(render_options or {}))
+
+def process_file(file_path, cached=None, render_options=None, fast=False, write=True, source=None):
+    """
+    Analyzes a single Python file and writes its per-file UML diagram next to it.
+
+    This is the unit of work used by the command line interface. It is a module level function so that it 
+    can be shipped to worker processes when running with '--jobs'.
+
+    Parameters:
+    - file_path (str): The path to the Python file to be analyzed.
+    - cached (tuple, optional): A previously computed (analysis_results, imported_modules) tuple for this file. 
+                                When given, the file is not parsed again.
+    - render_options (dict, optional): Extra keyword arguments for 'create_xml_output', such as 'layout'.
+    - fast (bool, optional): Use the header-only extraction of 'analyze_python_file'.
+    - write (bool, optional): Write the per-file diagram. When False the file is only analysed.
+    - source (bytes, optional): The content of the file, when it was already read. See 'analyze_python_file'.
+
+    Returns:
+    - tuple: A tuple (analysis_results, imported_modules, xmlPath) as produced by 'analyze_python_file', 
+             plus the path of the written .uxf file (None when 'write' is False).
+    """
+    xmlPath = os.path.splitext(file_path)[0] + ".uxf"
+    if cached is None:
+        thisAnalysis, thisImportedModules = analyze_python_file(file_path, fast, source)
+    else:
+        thisAnalysis, thisImportedModules = cached
+    if not write:
+        return thisAnalysis, thisImportedModules, None
+    create_xml_output(thisAnalysis, xmlPath, thisImportedModules, **(render_options or {}))
+    return thisAnalysis, thisImportedModules, xmlPath
+
+def _cache_lookup(cache, file_path):
+    """
+    The cached analysis of a file, or None, and on a cache miss the snapshot of the file to analyse and store 
+    back, so the cache entry is keyed by exactly the content that was analysed.
+    """
+    if not cache:
+        return None, None
+    cached = cache.get(file_path)
+    if cached is not None:
+        return cached, None
+    try:
+        return None, read_source(file_path)
+    except OSError:
+        # Left to the analysis, which reports the error
+        return None, None
+
+def process_files(inputFilePaths, jobs=1, cache=None, render_options=None, fast=False, write=True):
+    """
+    Runs 'process_file' over every input path, optionally spread across a pool of worker processes.
+
+    'inputFilePaths' may be any iterable, including a lazy directory walk; files are handed to the workers as 
+    soon as they are discovered, with a bounded number of them in flight at once. Results are always yielded 
+    in the order of 'inputFilePaths', regardless of which worker finishes first, so the merged diagram built 
+    from them is identical to the one produced by a serial run.
+
+    Parameters:
+    - inputFilePaths (iterable): The paths of the Python files to be analyzed.
+    - jobs (int, optional): The number of worker processes. 1 (the default) runs everything in this process, 
+                            0 uses one worker per CPU.
+    - cache (AnalysisCache, optional): A cache consulted before analysing each file. Fresh analyses are 
+                                       stored back into it by this process, so workers never write to it.
+    - render_options (dict, optional): Extra keyword arguments for 'create_xml_output', such as 'layout'.
+    - fast (bool, optional): Use the header-only extraction of 'analyze_python_file'.
+    - write (bool, optional): Write the per-file diagrams. When False the files are only analysed.
+
+    Yields:
+    - tuple: The (analysis_results, imported_modules, xmlPath) tuple of each file, in input order.
+    """
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    if jobs == 1:
+        for iterFilePath in inputFilePaths:
+            cached, snapshot = _cache_lookup(cache, iterFilePath)
+            result = process_file(iterFilePath, cached, render_options, fast, write, snapshot and snapshot[0])
+            if snapshot:
+                cache.put(iterFilePath, result[:2], snapshot)
+            yield result
+        return
+
+    # Keep a few files queued per worker so none of them idles while the next path is being discovered
+    maxPending = jobs * 4
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for iterFilePath in itertools.chain(inputFilePaths, [None]):
+            if iterFilePath is not None:
+                cached, snapshot = _cache_lookup(cache, iterFilePath)
+                pending.append((iterFilePath, snapshot, executor.submit(process_file, iterFilePath, cached, render_options,
+                                                                        fast, write, snapshot and snapshot[0])))
+                if len(pending) < maxPending:
+                    continue
+            while pending and (iterFilePath is None or len(pending) >= maxPending):
+                donePath, snapshot, future = pending.popleft()
+                result = future.result()
+                if snapshot:
+                    cache.put(donePath, result[:2], snapshot)
+                yield result
+
+def iter_analyses(paths, include=None, exclude=None, jobs=1, cache=None, fast=False):
+    """
+    Lazily analyses Python files and directories, one file at a time, without writing any diagram.
+
+    Files are analysed as the directory walk finds them and each analysis is yielded as soon as it is ready,
+    so only the file being consumed (plus, with 'jobs', the few files being prefetched by the workers) is
+    held in memory. Consumers that handle one file at a time can therefore process trees of any size.
+
+    Parameters:
+    - paths (list): File and directory paths, see 'crawl.iter_python_files'. A single path may be passed as
+                    a string.
+    - include (list, optional): Glob patterns of the files to pick up inside directories.
+    - exclude (list, optional): Glob patterns of the files and directories to skip inside directories.
+    - jobs (int, optional): The number of worker processes analysing files ahead of the consumer. 1 (the
+                            default) analyses each file when it is asked for, 0 uses one worker per CPU.
+    - cache (AnalysisCache, optional): A cache consulted before analysing each file and updated with fresh
+                                       analyses. Saving it is left to the caller.
+    - fast (bool, optional): Use the header-only extraction of 'analyze_python_file'.
+
+    Yields:
+    - tuple: (file_path, analysis_results, imported_modules) for each file, in the order they were found.
+
+    Raises:
+    - FileNotFoundError: If one of 'paths' is neither a file nor a directory.
+    - SyntaxError: If a file cannot be parsed. The iteration stops there.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    # process_files yields in input order, so the path of each result is the oldest one not yet yielded
+    pendingPaths = deque()
+    def discover():
+        for iterFilePath in iter_python_files(paths, include, exclude):
+            pendingPaths.append(iterFilePath)
+            yield iterFilePath
+
+    for thisAnalysis, thisImportedModules, _ in process_files(discover(), jobs, cache, fast=fast, write=False):
+        yield pendingPaths.popleft(), thisAnalysis, thisImportedModules
+
+def iter_classes(paths, include=None, exclude=None, jobs=1, cache=None, fast=False):
+    """
+    Lazily yields the classes of Python files and directories, file by file as they are analysed.
+
+    This is 'iter_analyses' flattened to the classes; see it for the parameters and for the files each
+    class comes from.
+
+    Yields:
+    - ClassInfo: The record of each class, in file order and, within a file, in source order.
+    """
+    for _, thisAnalysis, _ in iter_analyses(paths, include, exclude, jobs, cache, fast):
+        yield from thisAnalysis
+
+
+def watch_files(inputFilePaths, results, mergedPath="diagram.uxf", interval=1.0, cache=None, render_options=None, partition=None, jobs=1, fast=False):
+    """
+    Keeps the diagrams of 'inputFilePaths' up to date until interrupted.
+
+    The analyses of all files are held in memory. When a file changes only that file is analysed again and 
+    its own .uxf rewritten; the merged diagram is then rebuilt from the analyses already in memory, so no other 
+    file is read or parsed. When the merged diagram is partitioned and no class was added, removed or renamed, 
+    only the partitions the changed modules can reach are drawn again (see 'create_partitioned_output'). A file 
+    that fails to parse (e.g. while it is being edited) keeps its last good analysis until it parses again.
+
+    Parameters:
+    - inputFilePaths (list): The paths of the watched Python files, in the order used for the merged diagram.
+    - results (list): The (analysis_results, imported_modules, xmlPath) tuple of each file from the initial run, 
+                      in the same order as 'inputFilePaths'.
+    - mergedPath (str, optional): The path of the merged diagram, only written when more than one file is 
+                                  watched. Defaults to "diagram.uxf".
+    - interval (float, optional): The polling interval in seconds. Defaults to 1 second.
+    - cache (AnalysisCache, optional): A persistent cache updated with every new analysis.
+    - render_options (dict, optional): Extra keyword arguments for 'create_xml_output', such as 'layout'. With a 
+                                       'selection', only the merged diagram is written, even for a single file.
+    - partition (str, optional): When set, the merged diagram is written partitioned in this mode.
+    - jobs (int, optional): The number of worker processes used to render partitions.
+    - fast (bool, optional): Use the header-only extraction of 'analyze_python_file'.
+    """
+    writeFiles = "selection" not in (render_options or {})
+    analyses = {os.path.abspath(path): result[:2] for path, result in zip(inputFilePaths, results)}
+    pathsByAbsPath = {os.path.abspath(path): path for path in inputFilePaths}
+    watcher = FileWatcher(inputFilePaths, interval)
+    print(f"Watching {len(inputFilePaths)} file(s) for changes, press Ctrl+C to stop.")
+    try:
+        while True:
+            updated = False
+            changed = []
+            for absPath in watcher.wait():
+                iterFilePath = pathsByAbsPath[absPath]
+                if not os.path.isfile(iterFilePath):
+                    print(f"File <{iterFilePath}> was removed, keeping its last analysis.")
+                    continue
+                try:
+                    snapshot = read_source(iterFilePath)
+                    thisAnalysis, thisImportedModules, xmlPath = process_file(iterFilePath, render_options=render_options,
+                                                                              fast=fast, write=writeFiles, source=snapshot[0])
+                except (OSError, SyntaxError, ValueError) as e:
+                    print(f"Could not analyse <{iterFilePath}>: {e}")
+                    continue
+                if changed is not None:
+                    oldNames = [iterClass.class_name for iterClass in analyses[absPath][0]]
+                    if oldNames == [iterClass.class_name for iterClass in thisAnalysis]:
+                        changed.append(iterFilePath)
+                    else:
+                        # New or renamed classes can change how names resolve and are shown anywhere
+                        changed = None
+                analyses[absPath] = (thisAnalysis, thisImportedModules)
+                if cache:
+                    cache.put(iterFilePath, analyses[absPath], snapshot)
+                if xmlPath:
+                    print(f"Wrote to file: {xmlPath}")
+                updated = True
+
+            if updated and (len(inputFilePaths) > 1 or not writeFiles):
+                mergedResults = [analyses[absPath] + (None,) for absPath in pathsByAbsPath]
+                if partition:
+                    create_partitioned_output(inputFilePaths, mergedResults, mergedPath, partition, jobs, render_options,
+                                              changed=changed)
+                else:
+                    write_merged_output(inputFilePaths, mergedResults, mergedPath, render_options=render_options)
+                print(f"Wrote to file: {mergedPath}")
+            if updated and cache:
+                cache.save()
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+
+def add_analysis_arguments(parser):
+    """Adds the command line options that select and analyse the input files to an argument parser."""
+    parser.add_argument("--include", action="append", default=None, metavar="GLOB",
+                        help="Glob of files to pick up inside directories (default *.py). Can be repeated.")
+    parser.add_argument("--exclude", action="append", default=None, metavar="GLOB",
+                        help="Glob of files or directories to skip inside directories. Can be repeated.")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Directory of a persistent analysis cache. Unchanged files are not parsed again.")
+    parser.add_argument("--cache-size", type=int, default=256,
+                        help="Size cap of the analysis cache in MiB (default 256).")
+    parser.add_argument("--fast", action="store_true",
+                        help="Only read class and function headers, skipping function bodies other than __init__. "
+                             "Classes and imports inside functions are not picked up.")
+
+def job_count(value):
+    """An argparse type accepting a number of worker processes: a non-negative integer, 0 meaning one per CPU."""
+    try:
+        jobs = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number of jobs: {value!r}")
+    if jobs < 0:
+        raise argparse.ArgumentTypeError(f"the number of jobs must be 0 or more, not {jobs}")
+    return jobs
+
+def _regex(pattern):
+    """An argparse type accepting valid regular expressions."""
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        raise argparse.ArgumentTypeError(f"invalid regular expression {pattern!r}: {e}")
+    return pattern
+
+def add_render_arguments(parser):
+    """Adds the command line options that control how diagrams are laid out and written to an argument parser."""
+    parser.add_argument("--layout", choices=sorted(LAYOUT_ENGINES), default="polygon",
+                        help="Layout engine used to position the classes (default polygon).")
+    parser.add_argument("--iterations", type=int, default=None,
+                        help="Maximum number of iterations of the force layout (default 100).")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="Maximum number of seconds spent in the force layout per diagram.")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed of the force layout, for reproducible diagrams (default 0).")
+    parser.add_argument("--routing", choices=ROUTING_STYLES, default="straight",
+                        help="Draw arrows as straight lines, or as orthogonal lines going around the class boxes "
+                             "(default straight).")
+    parser.add_argument("--verbose-relations", action="store_true",
+                        help="Draw one arrow per relation instead of merging the relations between two classes "
+                             "into one arrow listing them.")
+    parser.add_argument("--focus", action="append", default=None, metavar="CLASS",
+                        help="Only draw this class and the classes within --depth relations of it. Can be repeated.")
+    parser.add_argument("--depth", type=int, default=1,
+                        help="How many relations away from the --focus classes to go (default 1).")
+    parser.add_argument("--include-classes", action="append", default=None, metavar="REGEX", type=_regex,
+                        help="Only draw classes whose name matches this regular expression. Can be repeated.")
+    parser.add_argument("--exclude-classes", action="append", default=None, metavar="REGEX", type=_regex,
+                        help="Do not draw classes whose name matches this regular expression. Can be repeated.")
+    parser.add_argument("--update", action="store_true",
+                        help="Update existing .uxf files instead of rewriting them, keeping the position of every "
+                             "class already in them and laying out only new classes.")
+    parser.add_argument("--partition", choices=PARTITION_MODES, default=None,
+                        help="Split the merged diagram into one diagram per module, package or connected component, "
+                             "written to diagram_parts/, with diagram.uxf as an overview.")
+
+def render_options_from(args):
+    """The 'render_options' of 'create_xml_output' selected by parsed 'add_render_arguments' options."""
+    renderOptions = {"layout": args.layout}
+    if args.routing != "straight":
+        renderOptions["routing"] = args.routing
+    if args.verbose_relations:
+        renderOptions["verbose_relations"] = True
+    if args.focus or args.include_classes or args.exclude_classes:
+        renderOptions["selection"] = {"focus": args.focus, "depth": args.depth,
+                                      "include": args.include_classes, "exclude": args.exclude_classes}
+    if args.update:
+        renderOptions["update"] = True
+    if args.layout == "force":
+        layoutOptions = {"iterations": args.iterations, "time_budget": args.time_budget, "seed": args.seed}
+        renderOptions["layout_options"] = {key: value for key, value in layoutOptions.items() if value is not None}
+    return renderOptions
+
+def missing_focus(focus, symbol_index):
+    """
+    The names of 'focus' that 'select_classes' finds no class for among the classes of 'symbol_index', under the 
+    names they are drawn with.
+    """
+    classNames = [symbol_index.display_name(qualified) for qualified in symbol_index.classes]
+    return [name for name in focus or () if not select_classes(classNames, (), focus=[name], depth=0)]
+
+def check_focus(parser, args, symbol_index):
+    """
+    Exits through 'parser.error' when one of the '--focus' classes of parsed 'add_render_arguments' options is 
+    not in 'symbol_index' (see 'missing_focus'). It is called before any diagram is written, so a mistyped name 
+    leaves the existing diagram alone.
+    """
+    missing = missing_focus(args.focus, symbol_index)
+    if missing:
+        parser.error(f"--focus: no class named {', '.join(f'<{name}>' for name in missing)} was found.")
+
+def analysis_cache_from(args):
+    """The 'AnalysisCache' selected by parsed 'add_analysis_arguments' options, or None."""
+    if not args.cache_dir:
+        return None
+    # Header-only analyses can differ from full ones, so they are cached under their own stamp
+    schemaVersion = f"{ANALYSIS_SCHEMA_VERSION}-fast" if args.fast else ANALYSIS_SCHEMA_VERSION
+    return AnalysisCache(args.cache_dir, schemaVersion, args.cache_size * 1024 * 1024)
+
+def analyze_command(argv):
+    """
+    The 'analyze' subcommand: analyses Python files and saves the results as an IR file (see 'ir.write_ir'),
+    without writing any diagram.
+
+    Returns:
+    - int: The exit status.
+    """
+    parser = argparse.ArgumentParser(prog="main.py analyze",
+                                     description="Analyse Python files and save the results for 'main.py render'.")
+    parser.add_argument("paths", nargs="+", help="Python files or directories to analyse.")
+    parser.add_argument("-o", "--output", required=True,
+                        help="The IR file to write. Paths ending in .json are written as JSON, others in binary.")
+    parser.add_argument("--format", choices=IR_FORMATS, default=None,
+                        help="Write the IR in this format regardless of the file extension.")
+    parser.add_argument("-j", "--jobs", type=job_count, default=1,
+                        help="Number of worker processes used to analyse files (0 = one per CPU, default 1).")
+    add_analysis_arguments(parser)
+    args = parser.parse_args(argv)
+
+    missing = [iterPath for iterPath in args.paths if not os.path.exists(iterPath)]
+    if missing:
+        parser.error(f"File <{missing[0]}> does not exist.")
+
+    cache = analysis_cache_from(args)
     inputFilePaths = []
-    if len(sys.argv) == 1:
+    def discover():
+        for iterFilePath in iter_python_files(args.paths, args.include, args.exclude):
+            inputFilePaths.append(iterFilePath)
+            yield iterFilePath
+
+    results = list(process_files(discover(), args.jobs, cache, fast=args.fast, write=False))
+    if cache:
+        cache.save()
+        print(f"Analysis cache: {cache.hits} hit(s), {cache.misses} miss(es).")
+    # The module names depend on the packages around the files, so they are recorded while the files are at hand
+    write_ir(args.output, [(iterFilePath, thisAnalysis, thisImportedModules, import_name(iterFilePath))
+                           for iterFilePath, (thisAnalysis, thisImportedModules, _) in zip(inputFilePaths, results)],
+             args.format)
+    print(f"Wrote the analysis of {len(inputFilePaths)} file(s) to: {args.output}")
+    return 0
+
+def render_command(argv):
+    """
+    The 'render' subcommand: writes the merged diagram of one or more IR files written by 'analyze'.
+
+    Returns:
+    - int: The exit status.
+    """
+    parser = argparse.ArgumentParser(prog="main.py render",
+                                     description="Render the diagram of files analysed by 'main.py analyze'.")
+    parser.add_argument("inputs", nargs="+", metavar="IR_FILE",
+                        help="IR files to render. The analyses of several files are merged into one diagram.")
+    parser.add_argument("-o", "--output", default="diagram.uxf",
+                        help="The diagram to write (default diagram.uxf).")
+    parser.add_argument("-j", "--jobs", type=job_count, default=1,
+                        help="Number of worker processes used to render partitions (0 = one per CPU, default 1).")
+    add_render_arguments(parser)
+    args = parser.parse_args(argv)
+
+    entries = []
+    for iterPath in args.inputs:
+        try:
+            entries.extend(read_ir(iterPath))
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+
+    inputFilePaths = [iterFilePath for iterFilePath, _, _, _ in entries]
+    results = [(thisAnalysis, thisImportedModules, None) for _, thisAnalysis, thisImportedModules, _ in entries]
+    modules = [module for _, _, _, module in entries]
+    symbolIndex = None
+    if args.focus:
+        symbolIndex = SymbolIndex()
+        for iterFilePath, (thisAnalysis, thisImportedModules, _), module in zip(inputFilePaths, results, modules):
+            symbolIndex.add(thisAnalysis, thisImportedModules, iterFilePath, module)
+        check_focus(parser, args, symbolIndex)
+    jobs = args.jobs or os.cpu_count() or 1
+    if not write_merged_output(inputFilePaths, results, args.output, symbolIndex, partition=args.partition, jobs=jobs,
+                               render_options=render_options_from(args), modules=modules):
+        print(f"Something went wrong with writing the file.")
+        return 1
+    print(f"Wrote to file: {args.output}")
+    if args.partition:
+        print(f"Wrote the partition diagrams to: {partitions_directory(args.output)}")
+    return 0
+
+# Subcommands splitting a run into its analysis and rendering halves. Without one, the command line analyses and
+# renders in a single run.
+SUBCOMMANDS = {
+    "analyze": analyze_command,
+    "render": render_command,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        sys.exit(SUBCOMMANDS[sys.argv[1]](sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description="Generate UMLet class diagrams from Python source files.")
+    parser.add_argument("paths", nargs="*",
+                        help="Python files or directories to analyse (defaults to example.py). "
+                             "Directories are searched recursively.")
+    add_analysis_arguments(parser)
+    parser.add_argument("-j", "--jobs", type=job_count, default=1,
+                        help="Number of worker processes used to analyse files (0 = one per CPU, default 1).")
+    add_render_arguments(parser)
+    parser.add_argument("--profile", nargs="?", const="profile.json", default=None, metavar="FILE",
+                        help="Record the wall time, calls and peak memory of every stage and write them as JSON "
+                             "(default profile.json). Stages run by worker processes are not recorded.")
+    parser.add_argument("--cprofile", default=None, metavar="FILE",
+                        help="Run under cProfile and write the pstats dump to FILE.")
+    parser.add_argument("-w", "--watch", action="store_true",
+                        help="Keep running and regenerate the diagrams of changed files.")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="Polling interval of --watch in seconds (default 1).")
+    args = parser.parse_args()
+
+    inputPaths = []
+    if not args.paths:
         print("No input filepath.")
-        print(f"Using <example.py>")
-        file_path = "example.py"
-        inputFilePaths.append(file_path)
     else:
-        for iterFilePath in sys.argv[1:]:     
-            if os.path.isfile(iterFilePath):
-                print(f"Using <{iterFilePath}> as file to analyse.")
-                inputFilePaths.append(iterFilePath)
+        for iterPath in args.paths:
+            if os.path.isfile(iterPath):
+                print(f"Using <{iterPath}> as file to analyse.")
+                inputPaths.append(iterPath)
+            elif os.path.isdir(iterPath):
+                print(f"Searching <{iterPath}> for files to analyse.")
+                inputPaths.append(iterPath)
             else: 
-                print(f"File <{file_path}> does not exist.")
-                if len(inputFilePaths) == 0:
-                    print(f"Using <example.py>")
-                    file_path = "example.py"
-                    inputFilePaths.append(file_path)
-                    break
-    analysis = []
-    imported_modules = []
-    for iterFilePath in inputFilePaths:
-        xmlPath = iterFilePath.replace(".py",".uxf")
+                print(f"File <{iterPath}> does not exist.")
+    if not inputPaths:
+        print(f"Using <example.py>")
+        inputPaths.append("example.py")
+
+    # Paths are recorded as they stream past so that watch mode and the merged diagram know what was analysed
+    inputFilePaths = []
+    def discover():
+        for iterFilePath in iter_python_files(inputPaths, args.include, args.exclude):
+            inputFilePaths.append(iterFilePath)
+            yield iterFilePath
+
+    renderOptions = render_options_from(args)
+    cache = analysis_cache_from(args)
+
+    profiler = None
+    if args.profile:
+        profiler = StageProfiler()
+        profiler.start()
+    functionProfiler = None
+    if args.cprofile:
+        functionProfiler = cProfile.Profile()
+        functionProfiler.enable()
 
-        thisAnalysis, thisImportedModules = analyze_python_file(iterFilePath)
+    analysis = []
+    results = []
+    symbolIndex = SymbolIndex()
+    # A selection is taken from the classes of all files, so it is only drawn as the merged diagram, even for a single 
+    # file, and the per-file diagrams are left as they are
+    writeFiles = "selection" not in renderOptions
+    for thisAnalysis, thisImportedModules, xmlPath in process_files(discover(), args.jobs, cache, renderOptions, args.fast, writeFiles):
         analysis.extend(thisAnalysis)
-        imported_modules.extend(thisImportedModules)
-        result = create_xml_output(thisAnalysis, xmlPath, thisImportedModules)
+        # Results arrive in discovery order, so this file is the next discovered path without a result
+        symbolIndex.add(thisAnalysis, thisImportedModules, inputFilePaths[len(results)])
+        results.append((thisAnalysis, thisImportedModules, xmlPath))
+
+    if cache:
+        cache.save()
+        print(f"Analysis cache: {cache.hits} hit(s), {cache.misses} miss(es).")
+    check_focus(parser, args, symbolIndex)
     
-    if len(inputFilePaths) > 1:
-        result = create_xml_output(analysis, "diagram.uxf", imported_modules)
-
-    if analysis:
-        print(f"Wrote to file: {xmlPath}")
-    else:
-        print(f"Something went wrong with writing the file.")
\ No newline at end of file
+    filePaths = [xmlPath for _, _, xmlPath in results if xmlPath]
+    if len(filePaths) == 1:
+        print(f"Wrote to file: {filePaths[0]}")
+    elif filePaths:
+        print(f"Wrote {len(filePaths)} per-file diagrams next to their source files.")
+    if len(inputFilePaths) > 1 or not writeFiles:
+        if write_merged_output(inputFilePaths, results, "diagram.uxf", symbolIndex, args.partition, args.jobs, renderOptions):
+            print(f"Wrote to file: diagram.uxf")
+            if args.partition:
+                print(f"Wrote the partition diagrams to: {partitions_directory('diagram.uxf')}")
+        else:
+            print(f"Something went wrong with writing the file.")
+    elif not analysis:
+        print(f"Something went wrong with writing the file.")
+
+    if functionProfiler:
+        functionProfiler.disable()
+        functionProfiler.dump_stats(args.cprofile)
+        print(f"Wrote cProfile statistics to: {args.cprofile}")
+    if profiler:
+        profiler.stop()
+        profiler.write(args.profile)
+        print(profiler.summary())
+        print(f"Wrote profile to: {args.profile}")
+
+    if args.watch:
+        watch_files(inputFilePaths, results, interval=args.interval, cache=cache, render_options=renderOptions,
+                    partition=args.partition, jobs=args.jobs, fast=args.fast)
\ No newline at end of file
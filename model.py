@@ -0,0 +1,242 @@
+import sys
+
+
+class _Record:
+    """
+    Base class of the compact records produced by the analysis.
+
+    Records keep their fields in '__slots__' instead of a per-instance '__dict__', which roughly halves their
+    memory use compared with the dictionaries the analysis used to produce. For code written against those
+    dictionaries, records can still be read with 'record["field"]', 'record.get("field")', '"field" in record'
+    and 'record.keys()', which all go by field name, and 'to_dict' / 'from_dict' convert between both shapes.
+    Unlike a dictionary, a record iterates over its field values, not its field names, so that it unpacks like
+    a tuple in field order; use 'keys()' to loop over the names.
+
+    Subclasses list their fields in '_fields'. Any further slots hold derived data that is not compared,
+    unpacked or pickled, and is reset to None when a record is unpickled.
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def __iter__(self):
+        return (getattr(self, field) for field in self._fields)
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def keys(self):
+        return list(self._fields)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+    def __eq__(self, other):
+        return type(self) is type(other) and tuple(self) == tuple(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+    def __getstate__(self):
+        return tuple(self)
+
+    def __setstate__(self, state):
+        for field, value in zip(self._fields, state):
+            setattr(self, field, value)
+        for slot in self.__slots__:
+            if slot not in self._fields:
+                setattr(self, slot, None)
+
+
+class AttributeInfo(_Record):
+    """
+    A class attribute found by the analysis.
+
+    Attributes:
+    - name (str): The attribute name.
+    - type (str or tuple): The annotated or inferred type, a (container, element) tuple for annotations like
+                           List[Entity], or an empty string when unknown.
+    - docstring (str or None): The attribute's docstring, if one is known.
+    """
+
+    _fields = ("name", "type", "docstring")
+    __slots__ = _fields
+
+    def __init__(self, name, type=str(), docstring=None):
+        self.name = name
+        self.type = type
+        self.docstring = docstring
+
+    def to_dict(self):
+        result = {'name': self.name, 'type': self.type}
+        if self.docstring is not None:
+            result['docstring'] = self.docstring
+        return result
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(intern(data['name']), intern_type(data.get('type') or str()), data.get('docstring'))
+
+
+class MethodInfo(_Record):
+    """
+    A method found by the analysis.
+
+    Attributes:
+    - name (str): The method name.
+    - return_type (str, tuple or None): The return annotation, a (container, element) tuple for annotations like
+                                        List[Entity], or None when there is none.
+    - docstring (str): The formatted docstring, or an empty string.
+    - input_types (dict): Maps every argument name to its annotation, or to None when it has none.
+    """
+
+    _fields = ("name", "return_type", "docstring", "input_types")
+    __slots__ = _fields
+
+    def __init__(self, name, return_type=None, docstring=str(), input_types=None):
+        self.name = name
+        self.return_type = return_type
+        self.docstring = docstring
+        self.input_types = input_types if input_types is not None else {}
+
+    def to_dict(self):
+        return {'name': self.name, 'return_type': self.return_type, 'docstring': self.docstring,
+                'input_types': dict(self.input_types)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(intern(data['name']), intern_type(data.get('return_type')), data.get('docstring') or str(),
+                   {intern(arg): intern_type(argType) for arg, argType in data.get('input_types', {}).items()})
+
+
+class ClassInfo(_Record):
+    """
+    A class found by the analysis.
+
+    Attributes:
+    - class_name (str): The class name.
+    - docstring (str): The formatted docstring, or an empty string.
+    - methods (list): The class's methods as 'MethodInfo' records.
+    - attributes (list): The class's attributes as 'AttributeInfo' records.
+    - base_classes (list): The names of the base classes.
+    - rendered (ClassBox or None): The box of the class once it has been rendered by 'render_class_box'. It is
+                                   not a field of the record and is not updated when the record is changed.
+    """
+
+    _fields = ("class_name", "docstring", "methods", "attributes", "base_classes")
+    __slots__ = _fields + ("rendered",)
+
+    def __init__(self, class_name, docstring=str(), methods=None, attributes=None, base_classes=None):
+        self.class_name = class_name
+        self.docstring = docstring
+        self.methods = methods if methods is not None else []
+        self.attributes = attributes if attributes is not None else []
+        self.base_classes = base_classes if base_classes is not None else []
+        self.rendered = None
+
+    def to_dict(self):
+        return {'class_name': self.class_name, 'docstring': self.docstring,
+                'methods': [method.to_dict() for method in self.methods],
+                'attributes': [attr.to_dict() for attr in self.attributes],
+                'base_classes': list(self.base_classes)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(intern(data['class_name']), data.get('docstring') or str(),
+                   [MethodInfo.from_dict(method) for method in data.get('methods', [])],
+                   [AttributeInfo.from_dict(attr) for attr in data.get('attributes', [])],
+                   [intern(base) for base in data.get('base_classes', [])])
+
+
+class ClassBox(_Record):
+    """
+    The rendered box of a class: the text of its UMLet properties panel and the size it needs.
+
+    Attributes:
+    - panel_attributes (str): The text of the properties panel.
+    - longest_line (int): The length of the longest line shown in the box.
+    - w, h (int): The width and height of the box.
+    """
+
+    _fields = ("panel_attributes", "longest_line", "w", "h")
+    __slots__ = _fields
+
+    def __init__(self, panel_attributes, longest_line, w, h):
+        self.panel_attributes = panel_attributes
+        self.longest_line = longest_line
+        self.w = w
+        self.h = h
+
+
+class Relation(_Record):
+    """
+    A relationship between two classes of a diagram, drawn as an arrow.
+
+    Attributes:
+    - source (str): The name of the class the relation starts from.
+    - target (str): The name of the class the relation points at.
+    - relation_type (str): The label of the relation, e.g. "Inherits from".
+    """
+
+    _fields = ("source", "target", "relation_type")
+    __slots__ = _fields
+
+    def __init__(self, source, target, relation_type):
+        self.source = source
+        self.target = target
+        self.relation_type = relation_type
+
+
+class NodeBox(_Record):
+    """
+    The position and size of a box in a diagram.
+
+    Attributes:
+    - x, y (int): The top left corner.
+    - w, h (int): The width and height.
+    """
+
+    _fields = ("x", "y", "w", "h")
+    __slots__ = _fields
+
+    def __init__(self, x=0, y=0, w=0, h=0):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+
+
+def intern(name):
+    """Intern a name so that the many repeated type and class names of a project share one string object."""
+    return sys.intern(name) if type(name) is str else name
+
+
+def intern_type(annotation):
+    """Intern a type annotation, which is a string, a (possibly nested) tuple of strings, or None."""
+    if type(annotation) is tuple:
+        return tuple(intern_type(part) for part in annotation)
+    return intern(annotation)
+
+
+def as_class_infos(analysis_results):
+    """
+    Accept analysis results in either shape, converting the dictionaries of older callers into records.
+
+    Parameters:
+    - analysis_results (list): 'ClassInfo' records and/or class dictionaries.
+
+    Returns:
+    - list: The results as 'ClassInfo' records.
+    """
+    return [result if isinstance(result, ClassInfo) else ClassInfo.from_dict(result) for result in analysis_results]
@@ -0,0 +1,128 @@
+import functools
+import os
+import re
+
+PARTITION_MODES = ("module", "package", "component")
+
+
+def module_name(file_path, root=None):
+    """
+    Derive a dotted module name from the path of a Python file.
+
+    Parameters:
+    - file_path (str): The path of the Python file.
+    - root (str, optional): The directory the module name is relative to. Defaults to the current directory.
+
+    Returns:
+    - str: The module name, e.g. "pkg.sub.mod" for "pkg/sub/mod.py".
+    """
+    relative_path = os.path.relpath(os.path.splitext(file_path)[0], root or os.curdir)
+    parts = [part for part in relative_path.split(os.sep) if part not in ("", os.curdir)]
+    while parts and parts[0] == os.pardir:
+        parts.pop(0)
+    if len(parts) > 1 and parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts) or "__main__"
+
+
+@functools.lru_cache(maxsize=1024)
+def _package_of(directory):
+    """
+    The dotted name of the package 'directory' is, or "" when it holds no '__init__.py'. Cached, as every file
+    of a package asks for the same directories.
+    """
+    if not os.path.isfile(os.path.join(directory, "__init__.py")):
+        return ""
+    parent, name = os.path.split(directory)
+    outer = _package_of(parent) if parent != directory else ""
+    return f"{outer}.{name}" if outer else name
+
+
+def import_name(file_path):
+    """
+    Derive the name a Python file is imported by, from the packages (directories with an '__init__.py') it
+    is in, e.g. "email.mime.text" for "/usr/lib/python3/email/mime/text.py" whatever the current directory.
+
+    Parameters:
+    - file_path (str): The path of the Python file.
+
+    Returns:
+    - str: The dotted module name. For an '__init__.py' file this is the name of its package.
+    """
+    directory, fileName = os.path.split(os.path.abspath(file_path))
+    package = _package_of(directory)
+    name = os.path.splitext(fileName)[0]
+    if name == "__init__" and package:
+        return package
+    return f"{package}.{name}" if package else name
+
+
+def safe_file_name(name):
+    """Turn a partition name into something usable as a file name."""
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name) or "_"
+
+
+def _components(names, relations):
+    """Group names into the connected components of the (undirected) relation graph with a union-find."""
+    parent = {name: name for name in names}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for relation in relations:
+        source, target = relation.source, relation.target
+        if source in parent and target in parent:
+            rootSource, rootTarget = find(source), find(target)
+            if rootSource != rootTarget:
+                parent[rootTarget] = rootSource
+
+    groups = {}
+    for name in names:
+        groups.setdefault(find(name), []).append(name)
+    return list(groups.values())
+
+
+def partition_classes(classModules, relations, mode="package", singleton_group="misc", top_level_group="top_level"):
+    """
+    Split the classes of a diagram into partitions that can be laid out and written independently.
+
+    Parameters:
+    - classModules (dict): Maps every class name to the dotted name of the module defining it, in diagram order.
+    - relations (list): The 'Relation' records of the diagram.
+    - mode (str, optional): How to partition: "module" puts each module in its own partition, "package" each
+                            package (the module name without its last part), and "component" each connected
+                            component of the relation graph. Defaults to "package".
+    - singleton_group (str, optional): In "component" mode, classes without any relation are collected in a
+                                       single partition of this name instead of one partition each.
+    - top_level_group (str, optional): In "package" mode, the partition of modules that are not in a package.
+
+    Returns:
+    - dict: Maps each partition name to the list of its class names, both in diagram order.
+
+    Raises:
+    - ValueError: If 'mode' is not one of 'PARTITION_MODES'.
+    """
+    partitions = {}
+    if mode == "module":
+        for name, module in classModules.items():
+            partitions.setdefault(module, []).append(name)
+    elif mode == "package":
+        for name, module in classModules.items():
+            package = module.rpartition(".")[0] or top_level_group
+            partitions.setdefault(package, []).append(name)
+    elif mode == "component":
+        singletons = []
+        for component in _components(list(classModules), relations):
+            if len(component) == 1:
+                singletons.extend(component)
+            else:
+                # Name the component after its first class, which is stable across runs
+                partitions[f"{component[0]}_group"] = component
+        if singletons:
+            partitions[singleton_group] = singletons
+    else:
+        raise ValueError(f"Unsupported partition mode: {mode}")
+    return partitions
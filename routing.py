@@ -0,0 +1,355 @@
+import heapq
+from bisect import bisect_left, bisect_right
+
+ROUTING_STYLES = ("straight", "orthogonal")
+
+# Unit vectors pointing out of each side, in the order of 'geometry.SIDES'
+_OUTWARDS = ((0, -1), (0, 1), (1, 0), (-1, 0))
+
+
+class GridIndex:
+    """
+    A uniform grid over a set of rectangles, answering which rectangles an axis-parallel segment crosses.
+
+    Every rectangle is registered in the cells it overlaps. For each row of cells the occupied columns are kept
+    sorted, and for each column the occupied rows, so a segment only visits the occupied cells along it: a query
+    costs O(log n + k) for the k rectangles near the segment, however long it is and however many rectangles
+    the grid holds.
+
+    Attributes:
+    - rects (list): The (x0, y0, x1, y1) corners of each rectangle.
+    - cell_size (int): The width and height of a cell.
+    """
+
+    def __init__(self, rects, cell_size=None):
+        """
+        Parameters:
+        - rects (list): (x0, y0, x1, y1) tuples with x0 <= x1 and y0 <= y1.
+        - cell_size (int, optional): The size of a cell. Defaults to the mean size of the rectangles, so that
+                                     most rectangles lie in a handful of cells.
+        """
+        self.rects = list(rects)
+        if cell_size is None:
+            sizes = [max(x1 - x0, y1 - y0) for x0, y0, x1, y1 in self.rects]
+            cell_size = sum(sizes) // len(sizes) if sizes else 1
+        self.cell_size = max(1, int(cell_size))
+        self._cells = {}
+        for i, (x0, y0, x1, y1) in enumerate(self.rects):
+            for cy in range(y0 // self.cell_size, y1 // self.cell_size + 1):
+                for cx in range(x0 // self.cell_size, x1 // self.cell_size + 1):
+                    self._cells.setdefault((cx, cy), []).append(i)
+        self._rows, self._columns = {}, {}
+        for cx, cy in self._cells:
+            self._rows.setdefault(cy, []).append(cx)
+            self._columns.setdefault(cx, []).append(cy)
+        for cells in self._rows.values():
+            cells.sort()
+        for cells in self._columns.values():
+            cells.sort()
+
+    def crossed(self, x0, y0, x1, y1, limit=None):
+        """
+        Finds the rectangles whose interior a horizontal or vertical segment passes through. Touching the border
+        of a rectangle does not count.
+
+        Parameters:
+        - x0, y0, x1, y1 (int): The start and end of the segment.
+        - limit (int, optional): Stop after finding this many rectangles.
+
+        Returns:
+        - list: The indices of the crossed rectangles into 'rects', roughly in the order the segment reaches them
+                going from (x0, y0) to (x1, y1).
+        """
+        size = self.cell_size
+        horizontal = y0 == y1
+        if horizontal:
+            low, high, line = min(x0, x1), max(x0, x1), self._rows.get(y0 // size, [])
+        else:
+            low, high, line = min(y0, y1), max(y0, y1), self._columns.get(x0 // size, [])
+        along = line[bisect_left(line, low // size):bisect_right(line, high // size)]
+        if (x1 < x0) if horizontal else (y1 < y0):
+            along.reverse()
+
+        hits = []
+        seen = set()
+        for position in along:
+            for i in self._cells[(position, y0 // size) if horizontal else (x0 // size, position)]:
+                if i in seen:
+                    continue
+                seen.add(i)
+                rx0, ry0, rx1, ry1 = self.rects[i]
+                if horizontal:
+                    if ry0 < y0 < ry1 and low < rx1 and rx0 < high:
+                        hits.append(i)
+                elif rx0 < x0 < rx1 and low < ry1 and ry0 < high:
+                    hits.append(i)
+            if limit is not None and len(hits) >= limit:
+                return hits[:limit]
+        return hits
+
+
+def _simplify(points):
+    """Drop repeated points and the middle one of three collinear points."""
+    path = []
+    for point in points:
+        if path and point == path[-1]:
+            continue
+        if len(path) >= 2:
+            (ax, ay), (bx, by) = path[-2], path[-1]
+            if (ax == bx == point[0]) or (ay == by == point[1]):
+                path[-1] = point
+                continue
+        path.append(point)
+    return path
+
+
+def _length(points):
+    """The length of a route of horizontal and vertical segments."""
+    return sum(abs(x1 - x0) + abs(y1 - y0) for (x0, y0), (x1, y1) in zip(points, points[1:]))
+
+
+class OrthogonalRouter:
+    """
+    Routes arrows between boxes as sequences of horizontal and vertical segments that go around other boxes.
+
+    Each arrow leaves its source box perpendicular to the side it is attached to, for 'clearance' pixels, and
+    enters its target box the same way. The two ends are first joined with one bend (an L) or two bends (a Z),
+    trying the Z routes through the gaps beside the first box in the way, shortest first. When none of them is
+    clear, the route is found by probing: it moves towards its end along one axis until a box is in the way,
+    slides along that box to its corner and carries on past it, then does the same along the other axis. Each
+    move is one query of a 'GridIndex' of the boxes, which only looks at the boxes near the move, so routing
+    an arrow costs about the number of boxes it has to go around, not the number of boxes in the diagram.
+    After 'max_attempts' queries the arrow is finished with the shortest route crossing the fewest boxes.
+
+    The inner segments of a route are moved sideways by 'spacing' pixels while they would run on top of the
+    inner segment of an arrow routed before, so parallel arrows stay apart.
+    """
+
+    def __init__(self, boxes, clearance=10, spacing=8, max_attempts=200, max_shifts=8):
+        """
+        Parameters:
+        - boxes (list): The (x, y, w, h) of every box, as ints.
+        - clearance (int, optional): The distance arrows keep from boxes.
+        - spacing (int, optional): The distance between parallel segments of different arrows.
+        - max_attempts (int, optional): The number of index queries spent on one arrow at most.
+        - max_shifts (int, optional): How many times a segment is moved aside to clear another arrow.
+        """
+        self.clearance = clearance
+        self.spacing = spacing
+        self.max_attempts = max_attempts
+        self.max_shifts = max_shifts
+        self.index = GridIndex([(x - clearance, y - clearance, x + w + clearance, y + h + clearance)
+                                for x, y, w, h in boxes])
+        # Maps ("h", y) and ("v", x) to the (low, high) extents of the inner segments already on that line
+        self._tracks = {}
+
+    def _free(self, orientation, coordinate, low, high):
+        return not any(low < otherHigh and otherLow < high
+                       for otherLow, otherHigh in self._tracks.get((orientation, coordinate), ()))
+
+    def _spread(self, orientation, coordinate, low, high, direction=None):
+        """
+        The nearest coordinate to 'coordinate' whose track is free between 'low' and 'high', looking on both
+        sides or only in 'direction' (1 or -1).
+        """
+        for shift in range(self.max_shifts + 1):
+            if shift == 0:
+                candidates = (coordinate,)
+            elif direction is None:
+                candidates = (coordinate + shift * self.spacing, coordinate - shift * self.spacing)
+            else:
+                candidates = (coordinate + direction * shift * self.spacing,)
+            for candidate in candidates:
+                if self._free(orientation, candidate, low, high):
+                    return candidate
+        return coordinate
+
+    @staticmethod
+    def _path(start, end, shape, middle=None):
+        """
+        A route from 'start' to 'end': an L going horizontally ("hv") or vertically ("vh") first, or a Z with a
+        vertical ("v") or horizontal ("h") middle segment at 'middle'.
+        """
+        (sx, sy), (ex, ey) = start, end
+        if shape == "hv":
+            return [start, (ex, sy), end]
+        if shape == "vh":
+            return [start, (sx, ey), end]
+        if shape == "v":
+            return [start, (middle, sy), (middle, ey), end]
+        return [start, (sx, middle), (ex, middle), end]
+
+    def _crossed(self, points, limit=2):
+        """The first (up to 'limit') boxes a route crosses, in the order it reaches them."""
+        hits = []
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            for i in self.index.crossed(x0, y0, x1, y1, limit - len(hits)):
+                if i not in hits:
+                    hits.append(i)
+            if len(hits) >= limit:
+                break
+        return hits
+
+    def _direct(self, start, end, rank, budget, attempts):
+        """
+        Searches a route from 'start' to 'end' with at most two bends.
+
+        Parameters:
+        - rank (callable): Orders routes by their points, before the number of boxes they cross is known.
+        - budget (list): The number of index queries left for the arrow, shared with the caller.
+        - attempts (int): The number of routes this search may try.
+
+        Returns:
+        - tuple: The (score, points, crossed boxes) of the best route found, lowest score first.
+        """
+        (sx, sy), (ex, ey) = start, end
+        queue = []
+        tried = set()
+
+        def push(shape, middle=None):
+            if (shape, middle) not in tried:
+                tried.add((shape, middle))
+                heapq.heappush(queue, (rank(self._path(start, end, shape, middle)), len(tried), shape, middle))
+
+        push("hv")
+        push("vh")
+        push("v", (sx + ex) // 2)
+        push("h", (sy + ey) // 2)
+
+        best = None
+        while queue and attempts > 0 and (budget[0] > 0 or best is None):
+            attempts -= 1
+            budget[0] -= 1
+            order, _, shape, middle = heapq.heappop(queue)
+            # The middle segment is only moved aside for the routes actually tried
+            if shape == "v":
+                middle = self._spread("v", middle, min(sy, ey), max(sy, ey))
+            elif shape == "h":
+                middle = self._spread("h", middle, min(sx, ex), max(sx, ex))
+            points = self._path(start, end, shape, middle)
+            hits = self._crossed(points)
+            if best is None or (len(hits),) + order < best[0]:
+                best = ((len(hits),) + order, points, hits)
+            if not hits:
+                break
+            # Try passing the first box in the way on either side
+            x0, y0, x1, y1 = self.index.rects[hits[0]]
+            push("v", x0)
+            push("v", x1)
+            push("h", y0)
+            push("h", y1)
+        return best
+
+    def _connect(self, start, end, vertical, rank, budget):
+        """
+        Routes from 'start' to 'end' around any number of boxes.
+
+        While no short route is clear, the route moves towards 'end' along one axis, starting with the vertical
+        one if 'vertical' is true. When a box is in the way it stops in front of the box, slides along it to
+        the corner nearer to 'end' and carries on past the box. Each move is one query of the index.
+
+        Returns:
+        - list: The points of the route.
+        """
+        best = self._direct(start, end, rank, budget, 6)
+        if not best[2]:
+            return best[1]
+        points = [start]
+        current = start
+        seen = set()
+        while current != end and budget[0] > 0:
+            (cx, cy), (ex, ey) = current, end
+            if (cy == ey) if vertical else (cx == ex):
+                vertical = not vertical
+            target = (cx, ey) if vertical else (ex, cy)
+            budget[0] -= 1
+            hits = self.index.crossed(cx, cy, target[0], target[1], 1)
+            if not hits:
+                points.append(target)
+                current = target
+                vertical = not vertical
+                continue
+
+            # Stop in front of the box in the way, making sure no other box comes first
+            while hits and budget[0] > 0:
+                x0, y0, x1, y1 = self.index.rects[hits[0]]
+                stop = (cx, y1 if ey < cy else y0) if vertical else (x1 if ex < cx else x0, cy)
+                if ((stop[1] - cy) * (ey - cy) if vertical else (stop[0] - cx) * (ex - cx)) < 0:
+                    # The route stands inside the box, where there is no way around it
+                    break
+                budget[0] -= 1
+                hits = self.index.crossed(cx, cy, stop[0], stop[1], 1)
+            if hits:
+                break
+            # Slide along it to one of its sides, keeping clear of arrows already passing there, where the way
+            # past the box is free
+            if vertical:
+                sides = sorted(((x0, -1), (x1, 1)), key=lambda side: abs(side[0] - ex))
+                low, high, beyond = y0, y1, (y0 if ey < cy else y1)
+            else:
+                sides = sorted(((y0, -1), (y1, 1)), key=lambda side: abs(side[0] - ey))
+                low, high, beyond = x0, x1, (x0 if ex < cx else x1)
+            slide = None
+            for coordinate, direction in sides:
+                spread = self._spread("v" if vertical else "h", coordinate, low, high, direction)
+                for candidate in ((spread, coordinate) if spread != coordinate else (coordinate,)):
+                    if vertical:
+                        candidate, past = (candidate, stop[1]), (candidate, beyond)
+                    else:
+                        candidate, past = (stop[0], candidate), (beyond, candidate)
+                    if (candidate, vertical) in seen:
+                        continue
+                    budget[0] -= 2
+                    if not (self.index.crossed(stop[0], stop[1], candidate[0], candidate[1], 1)
+                            or self.index.crossed(candidate[0], candidate[1], past[0], past[1], 1)):
+                        slide = candidate
+                        break
+                if slide is not None:
+                    break
+            if slide is None:
+                break
+            points.extend((stop, slide))
+            current = slide
+            seen.add((slide, vertical))
+        if current != end:
+            # Out of options: finish with a short route, crossing what it must, unless going straight was better
+            tail = self._direct(current, end, rank, budget, 2)
+            if len(tail[2]) >= len(best[2]):
+                return best[1]
+            points.extend(tail[1][1:])
+        return points
+
+    def route(self, start, side1, end, side2):
+        """
+        Routes one arrow.
+
+        Parameters:
+        - start, end (tuple): The (x, y) anchors of the arrow on its source and target box.
+        - side1, side2 (int): The sides the anchors lie on, as indices into 'geometry.SIDES'.
+
+        Returns:
+        - list: The (x, y) points of the arrow, from 'start' to 'end'.
+        """
+        (dx1, dy1), (dx2, dy2) = _OUTWARDS[side1], _OUTWARDS[side2]
+        first = (start[0] + dx1 * self.clearance, start[1] + dy1 * self.clearance)
+        last = (end[0] + dx2 * self.clearance, end[1] + dy2 * self.clearance)
+
+        def rank(points):
+            # Routes turning back into the box they leave or enter come last, then longer routes
+            (x0, y0), (x1, y1) = points[0], points[1]
+            (x2, y2), (x3, y3) = points[-2], points[-1]
+            reversals = 0
+            if points[0] == first and (x1 - x0) * dx1 + (y1 - y0) * dy1 < 0:
+                reversals += 1
+            if points[-1] == last and (x3 - x2) * dx2 + (y3 - y2) * dy2 > 0:
+                reversals += 1
+            return reversals, _length(points)
+
+        points = _simplify(self._connect(first, last, dx1 == 0, rank, [self.max_attempts]))
+        # Keep the inner segments on their tracks, for the arrows routed after this one
+        for (x0, y0), (x1, y1) in zip(points[1:-2], points[2:-1]):
+            if x0 == x1:
+                self._tracks.setdefault(("v", x0), []).append((min(y0, y1), max(y0, y1)))
+            else:
+                self._tracks.setdefault(("h", y0), []).append((min(x0, x1), max(x0, x1)))
+        return _simplify([start] + points + [end])
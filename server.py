@@ -0,0 +1,437 @@
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import signal
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from crawl import iter_python_files
+from main import LAYOUT_ENGINES, SymbolIndex, analyze_python_file, job_count, missing_focus, write_merged_output
+from routing import ROUTING_STYLES
+
+# Requests are small JSON documents; anything larger is refused before it is read
+MAX_REQUEST_BYTES = 1024 * 1024
+# The number of rendered diagrams kept to answer repeated requests for unchanged files
+RENDER_CACHE_SIZE = 32
+# The default number of file analyses kept in memory, which at a few dozen KB each stays well under a GB
+STORE_SIZE = 20000
+_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 415: "Unsupported Media Type", 422: "Unprocessable Entity",
+            500: "Internal Server Error"}
+# The Host headers a local client sends. Anything else is a page reaching the server through DNS rebinding.
+_LOCAL_HOSTS = ("localhost", "127.0.0.1", "[::1]")
+
+
+class RequestError(Exception):
+    """An error reported to the client with an HTTP status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _fingerprint(path):
+    """The (size, mtime) stat key and the SHA-256 hex digest of the content of a file."""
+    stat = os.stat(path)
+    with open(path, "rb") as file:
+        digest = hashlib.sha256(file.read()).hexdigest()
+    return (stat.st_size, stat.st_mtime_ns), digest
+
+
+def _host_name(host):
+    """The host of a Host header without its port, e.g. "localhost" for "localhost:8765" and "[::1]" for "[::1]:80"."""
+    if host.startswith("["):
+        return host[:host.find("]") + 1]
+    return host.partition(":")[0]
+
+
+class AnalysisStore:
+    """
+    The analyses of every file a server has seen, kept in memory and checked against the files on each use.
+
+    A file whose size and modification time have not changed is answered straight from memory. Otherwise its
+    content is hashed, and it is only analysed again when the hash differs from the one of the stored
+    analysis, so touching a file or checking out the same content costs a read but no parse. Hashing runs in
+    a thread and analysing in the process pool, so neither blocks the event loop, and concurrent requests for
+    the same changed file share a single analysis. The analyses of the files least recently asked for are
+    dropped once more than 'max_files' are kept, and the analysis of a file is dropped when it is deleted.
+
+    Attributes:
+    - hits (int): The number of lookups answered from memory.
+    - misses (int): The number of lookups that required a fresh analysis.
+    """
+
+    def __init__(self, executor, max_files=STORE_SIZE):
+        """
+        Parameters:
+        - executor (concurrent.futures.Executor): The pool 'analyze_python_file' runs in.
+        - max_files (int, optional): The number of file analyses kept. Defaults to 'STORE_SIZE'.
+        """
+        self._executor = executor
+        self.max_files = max_files
+        # (absolute path, fast) -> (stat key, digest, (analysis_results, imported_modules)), least recently
+        # used first
+        self._entries = OrderedDict()
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, path, fast=False):
+        """
+        Returns the analysis of a file, analysing it only when its content changed since the last time.
+
+        Returns:
+        - tuple: (digest, (analysis_results, imported_modules)), with the digest of the analysed content.
+
+        Raises:
+        - RequestError: If the file does not exist or cannot be analysed.
+        """
+        key = (os.path.abspath(path), fast)
+        pending = self._pending.get(key)
+        if pending is None:
+            entry = self._entries.get(key)
+            try:
+                stat = os.stat(key[0])
+            except OSError:
+                self._entries.pop(key, None)
+                raise RequestError(404, f"File <{path}> does not exist.")
+            if entry is not None and entry[0] == (stat.st_size, stat.st_mtime_ns):
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1], entry[2]
+            pending = asyncio.ensure_future(self._refresh(key, entry))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        # Shielded so that a client hanging up does not cancel an analysis other requests are waiting for
+        return await asyncio.shield(pending)
+
+    async def _refresh(self, key, entry):
+        loop = asyncio.get_running_loop()
+        try:
+            stat, digest = await loop.run_in_executor(None, _fingerprint, key[0])
+        except OSError as e:
+            raise RequestError(404, f"Could not read <{key[0]}>: {e}")
+        if entry is not None and entry[1] == digest:
+            self.hits += 1
+            self._store(key, (stat, digest, entry[2]))
+            return digest, entry[2]
+
+        self.misses += 1
+        try:
+            result = await loop.run_in_executor(self._executor, analyze_python_file, key[0], key[1])
+        except (SyntaxError, ValueError) as e:
+            raise RequestError(422, f"Could not analyse <{key[0]}>: {e}")
+        self._store(key, (stat, digest, result))
+        return digest, result
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_files:
+            self._entries.popitem(last=False)
+
+
+class DiagramServer:
+    """
+    Renders diagrams on request from analyses kept warm in an 'AnalysisStore'.
+
+    Requests are HTTP/1.1, served over a Unix socket or a localhost port by 'serve':
+
+    - 'POST /render' with a JSON body answers with the merged diagram of the given files, as .uxf XML. The
+      body holds "paths" (files and directories, relative to the working directory of the server), and
+      optionally "include" and "exclude" globs, "fast", "layout", "layout_options", "routing",
+      "verbose_relations", "focus" with "depth", "include_classes" and "exclude_classes" regular
+      expressions, and "output" with "update". When "output" is given the diagram is also written to
+      that path, and updated in place there when "update" is true. "output" must be a .uxf file, inside
+      'output_root' when one is set.
+    - 'GET /status' answers with JSON counts of the files held in memory and of the requests served.
+
+    Any web page can send requests to a local port, so requests must come from a local client: bodies must be
+    sent as 'application/json', which a page cannot do without the browser asking first, and requests carrying
+    an 'Origin' header or naming another host than the local one are refused.
+
+    Diagrams rendered for unchanged files and options are kept, so a repeated request is answered without
+    laying anything out again.
+    """
+
+    def __init__(self, jobs=0, output_root=None, max_files=STORE_SIZE):
+        """
+        Parameters:
+        - jobs (int, optional): The number of worker processes analysing files. 0 (the default) uses one
+                                per CPU.
+        - output_root (str, optional): The directory every "output" of a request must be in. Without it any
+                                       .uxf path is accepted.
+        - max_files (int, optional): The number of file analyses kept in memory. Defaults to 'STORE_SIZE'.
+        """
+        self.output_root = os.path.realpath(output_root) if output_root else None
+        self._executor = ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1)
+        self.store = AnalysisStore(self._executor, max_files)
+        self._renders = OrderedDict()
+        self._directory = tempfile.mkdtemp(prefix="umlet-server-")
+        self._counter = itertools.count()
+        self.requests = 0
+
+    def close(self):
+        """Stops the worker processes and removes the temporary files."""
+        self._executor.shutdown()
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def _output_path(self, output):
+        """Checks the "output" of a request, which may only be a .uxf file, inside 'output_root' when it is set."""
+        if not isinstance(output, str) or not output:
+            raise RequestError(400, "'output' must be a path.")
+        if not output.lower().endswith(".uxf"):
+            raise RequestError(403, "'output' must be a .uxf file.")
+        if self.output_root is not None:
+            realPath = os.path.realpath(output)
+            if os.path.commonpath([realPath, self.output_root]) != self.output_root:
+                raise RequestError(403, f"'output' must be inside <{self.output_root}>.")
+        return output
+
+    def _options(self, request):
+        if not isinstance(request, dict):
+            raise RequestError(400, "The request must be a JSON object.")
+        paths = request.get("paths")
+        if not paths or not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+            raise RequestError(400, "'paths' must be a non-empty list of file and directory paths.")
+        for name in ("include", "exclude"):
+            globs = request.get(name)
+            if globs is not None and not (isinstance(globs, list) and all(isinstance(glob, str) for glob in globs)):
+                raise RequestError(400, f"'{name}' must be a list of glob patterns.")
+        layout = request.get("layout", "polygon")
+        if layout not in LAYOUT_ENGINES:
+            raise RequestError(400, f"Unknown layout <{layout}>, expected one of {', '.join(sorted(LAYOUT_ENGINES))}.")
+        layoutOptions = request.get("layout_options") or {}
+        if not isinstance(layoutOptions, dict):
+            raise RequestError(400, "'layout_options' must be an object.")
+        routing = request.get("routing", "straight")
+        if routing not in ROUTING_STYLES:
+            raise RequestError(400, f"Unknown routing <{routing}>, expected one of {', '.join(ROUTING_STYLES)}.")
+        focus = request.get("focus")
+        if isinstance(focus, str):
+            focus = [focus]
+        if focus is not None and not (isinstance(focus, list) and all(isinstance(name, str) for name in focus)):
+            raise RequestError(400, "'focus' must be a class name or a list of class names.")
+        depth = request.get("depth", 1)
+        if not isinstance(depth, int) or isinstance(depth, bool) or depth < 0:
+            raise RequestError(400, "'depth' must be a non-negative integer.")
+        patterns = {}
+        for name in ("include_classes", "exclude_classes"):
+            patterns[name] = request.get(name)
+            if patterns[name] is not None and not (isinstance(patterns[name], list)
+                                                   and all(isinstance(pattern, str) for pattern in patterns[name])):
+                raise RequestError(400, f"'{name}' must be a list of regular expressions.")
+            for pattern in patterns[name] or ():
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    raise RequestError(400, f"Invalid regular expression <{pattern}>: {e}.")
+        output = request.get("output")
+        if output is not None:
+            output = self._output_path(output)
+        renderOptions = {"layout": layout}
+        # Like '--iterations' and friends on the command line, layout options only apply to the force layout
+        if layoutOptions and layout == "force":
+            renderOptions["layout_options"] = layoutOptions
+        if routing != "straight":
+            renderOptions["routing"] = routing
+        if request.get("verbose_relations"):
+            renderOptions["verbose_relations"] = True
+        if focus or patterns["include_classes"] or patterns["exclude_classes"]:
+            renderOptions["selection"] = {"focus": focus, "depth": depth, "include": patterns["include_classes"],
+                                          "exclude": patterns["exclude_classes"]}
+        if output and request.get("update"):
+            renderOptions["update"] = True
+        return paths, request.get("include"), request.get("exclude"), bool(request.get("fast")), renderOptions, output
+
+    async def render(self, request):
+        """
+        Renders the diagram described by a '/render' request.
+
+        Returns:
+        - bytes: The .uxf file.
+
+        Raises:
+        - RequestError: If the request is invalid, a file is missing or cannot be analysed, or the diagram
+                        cannot be written.
+        """
+        paths, include, exclude, fast, renderOptions, output = self._options(request)
+        loop = asyncio.get_running_loop()
+        try:
+            filePaths = await loop.run_in_executor(None, lambda: list(iter_python_files(paths, include, exclude)))
+        except FileNotFoundError as e:
+            raise RequestError(404, f"File <{e}> does not exist.")
+        analyses = await asyncio.gather(*(self.store.get(iterFilePath, fast) for iterFilePath in filePaths))
+
+        key = (tuple(filePaths), tuple(digest for digest, _ in analyses), fast,
+               json.dumps(renderOptions, sort_keys=True))
+        if output is None and key in self._renders:
+            self._renders.move_to_end(key)
+            return self._renders[key]
+
+        results = [result + (None,) for _, result in analyses]
+        xmlPath = output or os.path.join(self._directory, f"{next(self._counter)}.uxf")
+        # Layout is CPU bound but runs in a thread, so the event loop keeps accepting requests meanwhile
+        data = await loop.run_in_executor(None, self._write, filePaths, results, xmlPath, renderOptions, output is None)
+        if data is None:
+            raise RequestError(500, f"Could not write <{xmlPath}>.")
+        if output is None:
+            self._renders[key] = data
+            while len(self._renders) > RENDER_CACHE_SIZE:
+                self._renders.popitem(last=False)
+        return data
+
+    @staticmethod
+    def _write(filePaths, results, xmlPath, renderOptions, temporary):
+        symbolIndex = SymbolIndex()
+        for iterFilePath, (thisAnalysis, thisImportedModules, _) in zip(filePaths, results):
+            symbolIndex.add(thisAnalysis, thisImportedModules, iterFilePath)
+        # Checked before writing, so that a mistyped name does not replace the "output" with an empty diagram
+        missing = missing_focus(renderOptions.get("selection", {}).get("focus"), symbolIndex)
+        if missing:
+            raise RequestError(422, f"No class named {', '.join(f'<{name}>' for name in missing)} was found.")
+        try:
+            if not write_merged_output(filePaths, results, xmlPath, symbolIndex, render_options=renderOptions):
+                return None
+            with open(xmlPath, "rb") as file:
+                return file.read()
+        finally:
+            if temporary and os.path.exists(xmlPath):
+                os.remove(xmlPath)
+
+    def status(self):
+        """The counters answered by '/status'."""
+        return {"files": len(self.store), "analysed": self.store.misses, "reused": self.store.hits,
+                "requests": self.requests, "diagrams": len(self._renders)}
+
+    async def dispatch(self, method, target, body, headers=None):
+        """
+        Answers one request.
+
+        Parameters:
+        - headers (dict, optional): The request headers, with lower case names.
+
+        Returns:
+        - tuple: (status, content type, body bytes).
+        """
+        headers = headers or {}
+        if "origin" in headers:
+            raise RequestError(403, "Requests from web pages are not accepted.")
+        host = headers.get("host", "localhost")
+        if _host_name(host).lower() not in _LOCAL_HOSTS:
+            raise RequestError(403, f"Requests for host <{host}> are not accepted.")
+        route = target.split("?", 1)[0]
+        if route == "/status":
+            if method != "GET":
+                raise RequestError(405, "Use GET /status.")
+            return 200, "application/json", json.dumps(self.status()).encode()
+        if route == "/render":
+            if method != "POST":
+                raise RequestError(405, "Use POST /render.")
+            if headers.get("content-type", "").split(";", 1)[0].strip().lower() != "application/json":
+                raise RequestError(415, "The request body must be sent as 'application/json'.")
+            try:
+                request = json.loads(body.decode("utf-8") or "null")
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                raise RequestError(400, f"The request is not valid JSON: {e}")
+            return 200, "application/xml", await self.render(request)
+        raise RequestError(404, f"No such endpoint: {route}")
+
+    async def handle(self, reader, writer):
+        """Serves one connection, which carries a single request."""
+        self.requests += 1
+        try:
+            try:
+                requestLine = (await reader.readline()).decode("latin-1").split()
+                if len(requestLine) != 3:
+                    raise RequestError(400, "Malformed request line.")
+                method, target, _ = requestLine
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    raise RequestError(400, "Malformed Content-Length.")
+                if length > MAX_REQUEST_BYTES:
+                    raise RequestError(413, f"Requests are limited to {MAX_REQUEST_BYTES} bytes.")
+                body = await reader.readexactly(length) if length > 0 else b""
+                status, contentType, payload = await self.dispatch(method, target, body, headers)
+            except RequestError as e:
+                status, contentType, payload = e.status, "application/json", json.dumps({"error": str(e)}).encode()
+            except asyncio.IncompleteReadError:
+                return
+            except Exception as e:  # Keep serving other requests whatever went wrong with this one
+                status, contentType, payload = 500, "application/json", json.dumps({"error": repr(e)}).encode()
+            head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\nContent-Type: {contentType}\r\n"
+                    f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n")
+            writer.write(head.encode("latin-1") + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(server, socket_path=None, port=8765):
+    """
+    Serves 'server' until cancelled, on the Unix socket 'socket_path' or else on localhost:'port'.
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        listener = await asyncio.start_unix_server(server.handle, path=socket_path)
+        print(f"Listening on {socket_path}")
+    else:
+        # Only ever bound to the loopback interface: requests name arbitrary local paths
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", port)
+        print(f"Listening on http://127.0.0.1:{port}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve UMLet class diagrams from analyses kept in memory.")
+    address = parser.add_mutually_exclusive_group()
+    address.add_argument("--socket", default=None, metavar="PATH", help="Listen on this Unix socket.")
+    address.add_argument("--port", type=int, default=8765, help="Listen on this localhost port (default 8765).")
+    parser.add_argument("-j", "--jobs", type=job_count, default=0,
+                        help="Number of worker processes used to analyse files (default 0 = one per CPU).")
+    parser.add_argument("--output-root", default=None, metavar="DIR",
+                        help="Only write the 'output' of requests to .uxf files inside this directory.")
+    parser.add_argument("--max-files", type=int, default=STORE_SIZE,
+                        help=f"Number of file analyses kept in memory (default {STORE_SIZE}). The files least "
+                             "recently rendered are analysed again when asked for.")
+    args = parser.parse_args()
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    # Service managers stop daemons with SIGTERM; shut down as cleanly as on Ctrl+C
+    signal.signal(signal.SIGTERM, stop)
+
+    if args.max_files < 1:
+        parser.error("--max-files must be at least 1.")
+    diagramServer = DiagramServer(args.jobs, args.output_root, args.max_files)
+    try:
+        asyncio.run(serve(diagramServer, args.socket, args.port))
+    except KeyboardInterrupt:
+        print("Stopped serving.")
+    finally:
+        diagramServer.close()
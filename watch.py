@@ -0,0 +1,94 @@
+import os
+import time
+
+try:
+    import inotify_simple
+except ImportError:  # Optional dependency, fall back to polling
+    inotify_simple = None
+
+
+class FileWatcher:
+    """
+    Watches a fixed set of files and reports which of them changed.
+
+    When the optional 'inotify_simple' package is installed (Linux only), the parent directories of the watched
+    files are registered with inotify and the watcher sleeps until the kernel reports a write or a rename into
+    place, which also covers editors that save by replacing the file. Otherwise the files are polled with
+    'os.stat' every 'interval' seconds. In both cases a file is only reported once its size or modification
+    time actually differs from the last time it was seen.
+
+    Attributes:
+    - paths (list): The absolute paths of the watched files.
+    - interval (float): The polling interval in seconds, also used as the inotify read timeout.
+    """
+
+    def __init__(self, paths, interval=1.0):
+        """
+        Starts watching 'paths' and records their current state.
+
+        Parameters:
+        - paths (list): The paths of the files to watch.
+        - interval (float, optional): The polling interval in seconds. Defaults to 1 second.
+        """
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.interval = interval
+        self._state = {path: self._stat(path) for path in self.paths}
+        self._inotify = None
+        if inotify_simple is not None:
+            try:
+                self._inotify = inotify_simple.INotify()
+            except OSError:
+                self._inotify = None
+        if self._inotify is not None:
+            mask = (inotify_simple.flags.CLOSE_WRITE | inotify_simple.flags.MOVED_TO |
+                    inotify_simple.flags.CREATE | inotify_simple.flags.DELETE)
+            self._dirs = {}
+            for path in self.paths:
+                directory = os.path.dirname(path)
+                if directory not in self._dirs.values():
+                    self._dirs[self._inotify.add_watch(directory, mask)] = directory
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def _changed(self, candidates):
+        changed = []
+        for path in candidates:
+            state = self._stat(path)
+            if state != self._state.get(path):
+                self._state[path] = state
+                changed.append(path)
+        return changed
+
+    def poll(self):
+        """
+        Checks every watched file once without blocking.
+
+        Returns:
+        - list: The absolute paths of the files that changed since the last check, in watch order.
+        """
+        return self._changed(self.paths)
+
+    def wait(self):
+        """
+        Blocks until at least one watched file changed.
+
+        Returns:
+        - list: The absolute paths of the files that changed, in watch order. A deleted file is reported as
+                changed; its path no longer exists when the caller looks at it.
+        """
+        while True:
+            if self._inotify is None:
+                time.sleep(self.interval)
+                changed = self.poll()
+            else:
+                events = self._inotify.read(timeout=int(self.interval * 1000))
+                touched = {os.path.join(self._dirs.get(event.wd, ""), event.name) for event in events}
+                changed = self._changed([path for path in self.paths if path in touched])
+            if changed:
+                return changed